@@ -2,9 +2,13 @@
 # Description: 
 
 import argparse
-from src import ModUpdater, ModDownloader
-from src.Utils import Config, pprint, cprint
+from src import LibraryUpdateChecker, ModDownloader
+from src.Utils import Config, ManifestIndex, ModNameResolver, pprint, cprint
+from src.Utils.manifest import MANIFESTFILE
+from src.Utils.names import NAMEFILE
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
+import signal
 import sys
 import qdarktheme
 
@@ -26,6 +30,9 @@ def main():
     # arg to use my config file
     parser.add_argument('-m', '--myconfig', action='store_true', help='Use my config file')
 
+    # arg to skip the url resolution cache
+    parser.add_argument('-n', '--no-cache', action='store_true', help='Bypass the url resolution cache')
+
     args = parser.parse_args()
 
     if args.myconfig:
@@ -39,14 +46,39 @@ def main():
         app = QApplication(sys.argv)
         qdarktheme.setup_theme()
         downloader = ModDownloader(config, start_with_ui=True, selected_game=args.game)
+        downloader.steamcmd.resolve_cache.bypass = args.no_cache or downloader.steamcmd.resolve_cache.bypass
+
+        # ctrl+c cancels the download and quits, the timer lets python see the signal while qt runs
+        signal.signal(signal.SIGINT, lambda *_: app.quit())
+        timer = QTimer()
+        timer.timeout.connect(lambda: None)
+        timer.start(500)
         app.exec()
+        # don't leave steamcmd running after the window is closed
+        downloader.cancel()
+        downloader.close()
 
     if args.update:
-        # if not args.game:
-        #     args.game = input('Please select a game to update mods for')
-
-        updater = ModUpdater(config, mod_wid="708455313")
-        print(updater.needs_update)
+        # check the selected game, or every game in the config if none was chosen
+        games = [args.game] if args.game else config.get_game_list_from_config()
+        manifest = ManifestIndex(config.get_data_path(MANIFESTFILE))
+        names = ModNameResolver(config.get_data_path(NAMEFILE))
+        max_age_hours = float(config.get('UPDATER', 'check_interval_hours', fallback=0))
+        for game in games:
+            # a game whose mod folder is missing, like one on an unmounted drive, doesn't stop the others
+            try:
+                report = LibraryUpdateChecker(
+                    config, game, manifest=manifest, max_age_hours=max_age_hours, names=names
+                ).check()
+            except OSError as e:
+                cprint(f'Could not check {game} for updates: {e}', 'red')
+                continue
+            for mod in report.outdated:
+                cprint(f'{mod.title} - {mod.wid} needs an update', 'yellow')
+            for mod in report.removed:
+                cprint(f'{mod.wid} has been removed from Steam', 'red')
+        manifest.close()
+        names.close()
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,10 @@
 import os
-import re
 import tkinter as tk
-import requests
 import customtkinter as ctk
 import typing
 
+from src.Utils import ModResolveException
+
 
 if typing.TYPE_CHECKING:
     from src import ModDownloader
@@ -211,36 +211,16 @@ class ModDownloaderUI(ctk.CTk):
         [(12345, 123456789)]
         """
         tuple_list = [] # list of tuples containing appid and wid
+        # the steamcmd resolver checks the resolution cache before requesting any page
+        resolver = self.mod_downloader.steamcmd.resolver
         
         for line in text.splitlines(): # loop through each line in the text
             if len(line) > 0: # if the line isn't empty
                 
-                if re.search(r"&search", line): # if the line contains a search query, remove it
-                    url = line.split("&search")[0]
-                
-                try: # check if the url is valid
-                    x = requests.get(url)
-                except Exception as e:
+                try: # resolve the url to its appid and wid pairs
+                    mods = resolver.resolve_url(line)
+                except ModResolveException as e:
                     print(e) # TODO handle this better
-                    continue
-                
-                # if the url is a collection
-                if re.search("SubscribeCollectionItem", x.text):
-                    dls = re.findall( # find all the appid and wid pairs
-                        r"SubscribeCollectionItem[\( ']+(\d+)[ ',]+(\d+)'", x.text
-                    )
-                    for wid, appid in dls: # add each pair to the tuple list
-                        tuple_list.append((appid, wid))
-                
-                # if the url is a workshop item
-                elif re.search("ShowAddToCollection", x.text): 
-                    wid, appid = re.findall(
-                        r"ShowAddToCollection[\( ']+(\d+)[ ',]+(\d+)'", x.text
-                    )[0]
-                    tuple_list.append((appid, wid))
-                
-                # if the url is invalid
-                else: 
                     self.console_output.insert( # output to the console
                         tk.END,
                         '"'
@@ -249,6 +229,10 @@ class ModDownloaderUI(ctk.CTk):
                     )
                     self.console_output.see(tk.END)
                     self.console_output.update()
+                    continue
+                
+                for wid, appid in mods: # add each pair to the tuple list
+                    tuple_list.append((appid, wid))
         
         return tuple_list
 
@@ -12,6 +12,11 @@ if TYPE_CHECKING:
 
 
 class UiTab_Downloader(QtWidgets.QTabWidget):
+    # the download runs on worker threads, which reach the widgets through these queued signals
+    text_added = QtCore.pyqtSignal(str, bool, str)
+    progress_changed = QtCore.pyqtSignal(int)
+    download_finished = QtCore.pyqtSignal()
+
     def __init__(self, parent_window: "Ui_Downloader"):
         super().__init__()
         self._parent_window = parent_window
@@ -67,6 +72,18 @@ class UiTab_Downloader(QtWidgets.QTabWidget):
             self.download_button, 2, 0, 1, 2, QtCore.Qt.AlignmentFlag.AlignHCenter
         )
 
+        # cancel button, shown while a download is running
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self._handle_cancel_button)
+        self.cancel_button.setVisible(False)
+        self.layout_.addWidget(
+            self.cancel_button, 3, 0, 1, 2, QtCore.Qt.AlignmentFlag.AlignHCenter
+        )
+
+        self.text_added.connect(self.add_text_to_console)
+        self.progress_changed.connect(self.update_progress_bar)
+        self.download_finished.connect(self.finish_download)
+
     def update_progress_bar(self, value: int):
         """Update the progress bar
 
@@ -82,14 +99,32 @@ class UiTab_Downloader(QtWidgets.QTabWidget):
         if len(urls) == 0 or urls[0] == "":
             self.add_text_to_console("No URLs entered", color="red")
             return
+        # shown before the download starts, so a download that is done right away can hide them again
+        self.download_button.setEnabled(False)
+        self.download_button.setVisible(False)
+        self.progress_bar.setVisible(True)
+        self.spinner_button.setVisible(True)
+        self.cancel_button.setEnabled(True)
+        self.cancel_button.setVisible(True)
         try:
             self._parent_window.mod_downloader.download_mods_list(urls)
-            self.download_button.setEnabled(False)
-            self.download_button.setVisible(False)
-            self.progress_bar.setVisible(True)
-            self.spinner_button.setVisible(True)
         except Exception as e:
             self.add_text_to_console(f"Error: {e}", color="red")
+            self.finish_download()
+
+    def finish_download(self):
+        """Reset the downloader and the widgets once every download is done"""
+        self._parent_window.mod_downloader.running = False
+        self.progress_bar.setVisible(False)
+        self.spinner_button.setVisible(False)
+        self.download_button.setEnabled(True)
+        self.download_button.setVisible(True)
+        self.cancel_button.setVisible(False)
+
+    def _handle_cancel_button(self):
+        """Cancel the running download"""
+        self.cancel_button.setEnabled(False)
+        self._parent_window.mod_downloader.cancel()
 
     def add_text_to_console(
         self, text: str, newline: bool = True, color: str = "white"
@@ -122,8 +157,9 @@ class Ui_CollapsibleOptions(QCollapsible):
         self._parent_window = parent_window
         self.mod_downloader = parent_window.mod_downloader
 
-        self.rename_mode: bool = False
-        self.copy_mode: bool = False
+        # the options start out as steamcmd has them from the config
+        self.rename_mode: bool = self._parent_window.steamcmd.rename_mode
+        self.copy_mode: bool = self._parent_window.steamcmd.installer.copy_mode
 
         self.setupUi()
 
@@ -132,12 +168,15 @@ class Ui_CollapsibleOptions(QCollapsible):
         # rename mode
         self.rename_mode_checkbox = QtWidgets.QCheckBox()
         self.rename_mode_checkbox.setText("Rename mode")
+        # checked before the handler is connected, so the console isn't told about it
+        self.rename_mode_checkbox.setChecked(self.rename_mode)
         self.rename_mode_checkbox.stateChanged.connect(self._handle_rename_mode_changed)
         self.addWidget(self.rename_mode_checkbox)
 
         # copy mode
         self.copy_mode_checkbox = QtWidgets.QCheckBox()
         self.copy_mode_checkbox.setText("Copy mode")
+        self.copy_mode_checkbox.setChecked(self.copy_mode)
         self.copy_mode_checkbox.stateChanged.connect(self._handle_copy_mode_changed)
         self.addWidget(self.copy_mode_checkbox)
 
@@ -163,6 +202,7 @@ class Ui_CollapsibleOptions(QCollapsible):
             self._parent_window.downloader_tab.add_text_to_console(
                 "Rename mode disabled", color="red"
             )
+        self._parent_window.steamcmd.rename_mode = self.rename_mode
 
     def _handle_copy_mode_changed(self):
         """When the copy mode is changed"""
@@ -176,6 +216,7 @@ class Ui_CollapsibleOptions(QCollapsible):
             self._parent_window.downloader_tab.add_text_to_console(
                 "Copy mode disabled", color="red"
             )
+        self._parent_window.steamcmd.installer.copy_mode = self.copy_mode
 
 
 class Ui_Options(QWidget):
@@ -184,8 +225,9 @@ class Ui_Options(QWidget):
         self._parent_window = parent_window
         self.mod_downloader = parent_window.mod_downloader
 
-        self.rename_mode: bool = False
-        self.copy_mode: bool = False
+        # the options start out as steamcmd has them from the config
+        self.rename_mode: bool = self._parent_window.steamcmd.rename_mode
+        self.copy_mode: bool = self._parent_window.steamcmd.installer.copy_mode
 
         self.setupUi()
 
@@ -216,6 +258,8 @@ class Ui_Options(QWidget):
         self.layout_.addWidget(self.rename_mode_label, 1, 0)
 
         self.rename_mode_checkbox = QtWidgets.QCheckBox()
+        # checked before the handler is connected, so the console isn't told about it
+        self.rename_mode_checkbox.setChecked(self.rename_mode)
         self.rename_mode_checkbox.stateChanged.connect(self._handle_rename_mode_changed)
         self.layout_.addWidget(self.rename_mode_checkbox, 1, 1)
 
@@ -224,6 +268,7 @@ class Ui_Options(QWidget):
         self.layout_.addWidget(self.copy_mode_label, 2, 0)
 
         self.copy_mode_checkbox = QtWidgets.QCheckBox()
+        self.copy_mode_checkbox.setChecked(self.copy_mode)
         self.copy_mode_checkbox.stateChanged.connect(self._handle_copy_mode_changed)
         self.layout_.addWidget(self.copy_mode_checkbox, 2, 1)
 
@@ -251,6 +296,7 @@ class Ui_Options(QWidget):
             self._parent_window.downloader_tab.add_text_to_console(
                 "Rename mode disabled", color="red"
             )
+        self._parent_window.steamcmd.rename_mode = self.rename_mode
 
     def _handle_copy_mode_changed(self):
         """When the copy mode is changed"""
@@ -264,6 +310,7 @@ class Ui_Options(QWidget):
             self._parent_window.downloader_tab.add_text_to_console(
                 "Copy mode disabled", color="red"
             )
+        self._parent_window.steamcmd.installer.copy_mode = self.copy_mode
 
     def _handle_game_selection_changed(self):
         """When the game selection is changed"""
@@ -2,6 +2,28 @@
 
 from .exceptions import *
 from .config import Config
+from .store import SQLiteStore
+from .cache import ResolutionCache, normalize_url
+from .metadata import WorkshopMetadata, MetadataProvider, SteamAPIMetadataProvider, ScraperMetadataProvider, get_metadata_provider
+from .acf import InstalledItem, parse_vdf, read_installed_items
+from .manifest import ManifestIndex, ManifestEntry
+from .expander import CollectionExpander
+from .scanner import PageScanner
+from .resolver import ModResolver, ResolveResult
+from .events import (
+    SteamCMDEvent, OutputLine, LoginOk, ItemStarted, ItemDownloaded, ItemFailed, ProcessExit, BatchEnd,
+    SteamCMDOutputParser, BatchResult, DownloadStats
+)
+from .retry import RetryScheduler, RetryState
+from .batching import AdaptiveBatcher
+from .journal import DownloadJournal, JournalEntry
+from .scheduling import SizeScheduler
+from .watchdog import ProcessWatchdog, WatchedProcess, kill_process_tree
+from .installer import ModInstaller, InstallResult, SyncReport
+from .names import ModNameResolver, read_about_name
+from .session import SteamCMDSession
+from .supervisor import SteamCMDSupervisor
+from .workers import SteamCMDWorkerPool, WorkerResult
 from .utils import SteamCMD, Game
 from termcolor import cprint
 from pprint import pprint
\ No newline at end of file
@@ -0,0 +1,185 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from threading import Lock
+import os
+import re
+
+# the dir under the steamcmd dir the worker pools keep their sandboxes in
+WORKERS_DIR = 'workers'
+
+# a quoted string or a brace, anything else in the file is whitespace or a comment
+TOKEN_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|([{}])|//[^\n]*')
+
+
+@dataclass
+class InstalledItem:
+    """
+    A workshop item as steamcmd recorded it in appworkshop_<appid>.acf
+    """
+    wid: str
+    size: Optional[int] = None
+    time_updated: Optional[float] = None
+    manifest: Optional[str] = None
+
+
+def parse_vdf(text: str) -> dict:
+    """
+    Parse the text of a VDF/ACF file
+
+    Parameters
+    ----------
+    text : str
+        The file content
+
+    Returns
+    -------
+    data : dict
+        The nested key/value pairs of the file
+    """
+    root = {}
+    stack = [root]
+    key = None
+
+    for match in TOKEN_RE.finditer(text):
+        string, brace = match.groups()
+        if string is not None:
+            string = string.replace('\\"', '"').replace('\\\\', '\\')
+            if key is None:
+                key = string
+            else:
+                stack[-1][key] = string
+                key = None
+        elif brace == '{':
+            section = {}
+            stack[-1][key] = section
+            stack.append(section)
+            key = None
+        elif brace == '}' and len(stack) > 1:
+            stack.pop()
+
+    return root
+
+
+def get_steamcmd_dir(steamcmd_path: str) -> str:
+    """
+    Get the steamcmd directory from a path that may point at steamcmd.exe
+    """
+    if steamcmd_path.lower().endswith('.exe'):
+        return os.path.dirname(steamcmd_path.replace('\\', os.sep))
+    return steamcmd_path
+
+
+def get_appworkshop_path(steamcmd_path: str, appid: str) -> str:
+    """
+    Get the path of the appworkshop acf file steamcmd writes for an appid
+    """
+    return os.path.join(get_steamcmd_dir(steamcmd_path), 'steamapps', 'workshop', f'appworkshop_{appid}.acf')
+
+
+def get_workshop_content_path(steamcmd_path: str, appid: str, wid: Optional[str] = None) -> str:
+    """
+    Get the directory steamcmd downloads the items of an appid to, or a single item's directory
+    """
+    path = os.path.join(get_steamcmd_dir(steamcmd_path), 'steamapps', 'workshop', 'content', str(appid))
+    return os.path.join(path, str(wid)) if wid is not None else path
+
+
+def get_workshop_downloads_path(steamcmd_path: str) -> str:
+    """
+    Get the directory steamcmd keeps the items it is still downloading in
+    """
+    return os.path.join(get_steamcmd_dir(steamcmd_path), 'steamapps', 'workshop', 'downloads')
+
+
+def get_sandbox_dirs(steamcmd_path: str) -> List[str]:
+    """
+    Get the install dirs of the worker sandboxes that exist under a steamcmd dir
+    """
+    try:
+        with os.scandir(os.path.join(get_steamcmd_dir(steamcmd_path), WORKERS_DIR)) as entries:
+            return sorted(entry.path for entry in entries if entry.is_dir())
+    except OSError:
+        return []
+
+
+# parsed files keyed by path, each with the (mtime, size) they were parsed at
+_cache: Dict[str, Tuple[Tuple[float, int], Dict[str, InstalledItem]]] = {}
+_cache_lock = Lock()
+
+
+def read_installed_items(steamcmd_path: str, appid: str) -> Dict[str, InstalledItem]:
+    """
+    Read the installed workshop items of an appid. The file is only parsed again
+    when its mtime or size changes
+
+    Parameters
+    ----------
+    steamcmd_path : str
+        The steamcmd directory, or the path to steamcmd.exe
+    appid : str
+        The appid of the game
+
+    Returns
+    -------
+    items : dict
+        The InstalledItem of each installed item keyed by wid. Empty if steamcmd
+        hasn't downloaded anything for the appid
+    """
+    path = get_appworkshop_path(steamcmd_path, appid)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {}
+    key = (stat.st_mtime, stat.st_size)
+
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+
+    with open(path, encoding='utf-8', errors='ignore') as acf_file:
+        data = parse_vdf(acf_file.read())
+
+    app_workshop = data.get('AppWorkshop', {})
+    details = app_workshop.get('WorkshopItemDetails', {})
+    items = {}
+    for wid, installed in app_workshop.get('WorkshopItemsInstalled', {}).items():
+        if not isinstance(installed, dict):
+            continue
+        time_updated = installed.get('timeupdated') or details.get(wid, {}).get('timeupdated')
+        items[wid] = InstalledItem(
+            wid,
+            size=int(installed['size']) if installed.get('size') else None,
+            time_updated=float(time_updated) if time_updated else None,
+            manifest=installed.get('manifest'),
+        )
+
+    with _cache_lock:
+        _cache[path] = (key, items)
+    return items
+
+
+def read_all_installed_items(steamcmd_path: str, appid: str) -> Dict[str, InstalledItem]:
+    """
+    Read the installed workshop items of an appid from the steamcmd dir and from every
+    worker sandbox under it. The sandboxes each keep their own acf, so an item can be in
+    several of them, the newest revision of it wins
+
+    Parameters
+    ----------
+    steamcmd_path : str
+        The steamcmd directory, or the path to steamcmd.exe
+    appid : str
+        The appid of the game
+
+    Returns
+    -------
+    items : dict
+        The InstalledItem of each installed item keyed by wid
+    """
+    items = dict(read_installed_items(steamcmd_path, appid))
+    for sandbox in get_sandbox_dirs(steamcmd_path):
+        for wid, item in read_installed_items(sandbox, appid).items():
+            if wid not in items or (item.time_updated or 0) > (items[wid].time_updated or 0):
+                items[wid] = item
+    return items
@@ -0,0 +1,206 @@
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .config import Config
+
+
+class AdaptiveBatcher:
+    """
+    Sizes batches from the throughput measured on the batches that already finished.
+    A batch is modelled as taking items * item_overhead + bytes / bytes_per_second
+    seconds, and is grown or shrunk to take about target_seconds
+    """
+    def __init__(
+        self,
+        batch_size: int = 5,
+        target_seconds: float = 120,
+        min_size: int = 1,
+        max_size: int = 50,
+        bytes_per_second: Optional[float] = None,
+        item_overhead: Optional[float] = None,
+        forgetting: float = 0.8,
+    ):
+        """
+        AdaptiveBatcher class init
+
+        Parameters
+        ----------
+        batch_size : int
+            The batch size to use until there are measurements
+        target_seconds : float
+            How long a batch should take
+        min_size : int
+            The smallest batch size
+        max_size : int
+            The largest batch size
+        bytes_per_second : float
+            The download speed measured in an earlier run, if any
+        item_overhead : float
+            The seconds each item costs on top of its download, measured in an earlier run, if any
+        forgetting : float
+            How much weight older batches keep when a new one is recorded, between 0 and 1
+        """
+        self.batch_size: int = batch_size
+        self.target_seconds: float = target_seconds
+        self.min_size: int = max(1, min_size)
+        self.max_size: int = max(self.min_size, max_size)
+        self.bytes_per_second: Optional[float] = bytes_per_second
+        self.item_overhead: Optional[float] = item_overhead
+        self.forgetting: float = forgetting
+
+        self._lock = Lock()
+        # the weighted sums of the least squares fit of duration = items * a + bytes * b
+        self._sums = [0.0] * 5
+
+    @property
+    def has_estimates(self) -> bool:
+        return bool(self.bytes_per_second) and self.item_overhead is not None
+
+    def record(self, items: int, size: int, duration: float):
+        """
+        Record a finished batch and update the estimates
+
+        Parameters
+        ----------
+        items : int
+            The number of items in the batch
+        size : int
+            The bytes the batch downloaded
+        duration : float
+            The seconds the batch took
+        """
+        if items <= 0 or duration <= 0:
+            return
+
+        with self._lock:
+            s = [value * self.forgetting for value in self._sums]
+            s[0] += items * items
+            s[1] += items * size
+            s[2] += size * size
+            s[3] += items * duration
+            s[4] += size * duration
+            self._sums = s
+
+            # solve the 2x2 normal equations, falling back to a single unknown when they are singular
+            det = s[0] * s[2] - s[1] * s[1]
+            overhead = per_byte = None
+            if det > 1e-9 * max(1.0, s[0] * s[2]):
+                overhead = (s[3] * s[2] - s[4] * s[1]) / det
+                per_byte = (s[0] * s[4] - s[1] * s[3]) / det
+
+            if overhead is None or overhead < 0 or per_byte is None or per_byte <= 0:
+                if size <= 0:
+                    # nothing was transferred, the whole batch was overhead
+                    overhead, per_byte = duration / items, None
+                else:
+                    overhead = self.item_overhead if self.item_overhead is not None else 0.0
+                    overhead = min(overhead, duration / items)
+                    transfer = duration - items * overhead
+                    per_byte = transfer / size if transfer > 0 else None
+
+            self.item_overhead = overhead
+            if per_byte:
+                self.bytes_per_second = 1 / per_byte
+
+    def estimate_seconds(self, size: Optional[int], average_size: Optional[float] = None) -> float:
+        """
+        Estimate how long a single item takes to download
+
+        Parameters
+        ----------
+        size : int
+            The size of the item in bytes, if it is known
+        average_size : float
+            The size used for items without a known size
+        """
+        size = size if size is not None else (average_size or 0)
+        return (self.item_overhead or 0.0) + size / self.bytes_per_second
+
+    def next_size(self, average_size: Optional[float] = None) -> int:
+        """
+        Get the number of items the next batch should have
+
+        Parameters
+        ----------
+        average_size : float
+            The average size of the items in bytes, if it is known
+
+        Returns
+        -------
+        batch_size : int
+            The batch size, the configured one until there are measurements
+        """
+        if not self.has_estimates:
+            return self.batch_size
+
+        per_item = self.estimate_seconds(None, average_size or self._average_item_bytes())
+        if per_item <= 0:
+            return self.max_size
+        return max(self.min_size, min(self.max_size, int(self.target_seconds / per_item)))
+
+    def _average_item_bytes(self) -> float:
+        """
+        The average bytes per item of the recorded batches
+        """
+        return self._sums[1] / self._sums[0] if self._sums[0] else 0.0
+
+    def take(self, pending: List[Tuple[str, str]], sizes: Dict[str, int], final: bool = False) -> int:
+        """
+        Get how many items from the front of the pending list make up the next batch.
+        With known item sizes the batch is packed up to the target duration
+
+        Parameters
+        ----------
+        pending : list
+            The (wid, appid) tuples waiting to be batched
+        sizes : dict
+            The known sizes in bytes keyed by wid
+        final : bool
+            Whether or not more items are coming. The last batch is returned even if it isn't full
+
+        Returns
+        -------
+        count : int
+            The number of items for the next batch, 0 if the batch isn't full yet
+        """
+        if not pending:
+            return 0
+
+        if not self.has_estimates or not sizes:
+            count = self.next_size()
+            if len(pending) >= count:
+                return count
+            return len(pending) if final else 0
+
+        known = [size for size in sizes.values() if size is not None]
+        average_size = sum(known) / len(known) if known else None
+        seconds = 0.0
+        for i, (wid, _) in enumerate(pending[:self.max_size]):
+            seconds += self.estimate_seconds(sizes.get(wid), average_size)
+            if seconds >= self.target_seconds:
+                return max(self.min_size, i + 1)
+        if len(pending) >= self.max_size:
+            return self.max_size
+        return len(pending) if final else 0
+
+    def load(self, config: 'Config'):
+        """
+        Load the estimates an earlier run saved in the config
+        """
+        bytes_per_second = config.get('DOWNLOADER', 'adaptive_bytes_per_second', fallback='')
+        item_overhead = config.get('DOWNLOADER', 'adaptive_item_overhead', fallback='')
+        if bytes_per_second:
+            self.bytes_per_second = float(bytes_per_second)
+        if item_overhead:
+            self.item_overhead = float(item_overhead)
+
+    def save(self, config: 'Config'):
+        """
+        Save the estimates to the config so the next run starts from them
+        """
+        if not self.has_estimates:
+            return
+        config['DOWNLOADER']['adaptive_bytes_per_second'] = f'{self.bytes_per_second:.1f}'
+        config['DOWNLOADER']['adaptive_item_overhead'] = f'{self.item_overhead:.3f}'
+        config.save()
@@ -0,0 +1,124 @@
+from typing import List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+import json
+import time
+
+from .store import SQLiteStore
+
+CACHEFILE = "resolve_cache.sqlite"
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a workshop url so that every link to the same item shares a cache key
+
+    Parameters
+    ----------
+    url : str
+        The url to normalize
+
+    Returns
+    -------
+    url : str
+        The normalized url
+    """
+    url = url.strip().split('&search')[0]
+    parts = urlsplit(url)
+    query = parse_qs(parts.query)
+
+    # workshop items and collections are identified by their id alone
+    if 'id' in query:
+        return f"https://steamcommunity.com/sharedfiles/filedetails/?id={query['id'][0]}"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, parts.query, ''))
+
+
+class ResolutionCache(SQLiteStore):
+    """
+    Persistent sqlite cache of url -> [(wid, appid), ...] resolutions
+    """
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS resolutions ('
+        'url TEXT PRIMARY KEY, mods TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS idx_resolutions_accessed ON resolutions (accessed)',
+    )
+
+    def __init__(self, path: str, ttl_hours: float = 168, max_entries: int = 10000, bypass: bool = False):
+        """
+        ResolutionCache class init
+
+        Parameters
+        ----------
+        path : str
+            The path to the sqlite file
+        ttl_hours : float
+            How long an entry stays valid. 0 keeps entries forever
+        max_entries : int
+            The number of entries to keep before the least recently used are evicted
+        bypass : bool
+            Skip reading from the cache. Fresh resolutions are still written to it
+        """
+        super().__init__(path)
+        self.ttl: float = ttl_hours * 3600
+        self.max_entries: int = max_entries
+        self.bypass: bool = bypass
+
+    def get(self, url: str) -> Optional[List[Tuple[str, str]]]:
+        """
+        Get the cached mods for a url
+
+        Parameters
+        ----------
+        url : str
+            The url to look up
+
+        Returns
+        -------
+        mods : list
+            A list of (wid, appid) tuples, or None on a miss, an expired entry or when bypassed
+        """
+        if self.bypass:
+            return None
+
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT mods, created FROM resolutions WHERE url = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            mods, created = row
+            if self.ttl and now - created > self.ttl:
+                self._conn.execute('DELETE FROM resolutions WHERE url = ?', (key,))
+                return None
+            self._conn.execute('UPDATE resolutions SET accessed = ? WHERE url = ?', (now, key))
+
+        return [tuple(mod) for mod in json.loads(mods)]
+
+    def set(self, url: str, mods: List[Tuple[str, str]]):
+        """
+        Cache the mods for a url, evicting the least recently used entries if the cache is full
+
+        Parameters
+        ----------
+        url : str
+            The url that was resolved
+        mods : list
+            A list of (wid, appid) tuples
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO resolutions (url, mods, created, accessed) VALUES (?, ?, ?, ?)',
+                (normalize_url(url), json.dumps(mods), now, now)
+            )
+            self._conn.execute(
+                'DELETE FROM resolutions WHERE url IN ('
+                'SELECT url FROM resolutions ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def clear(self):
+        """
+        Remove every entry from the cache
+        """
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM resolutions')
@@ -16,10 +16,40 @@ updater_config = {
     'mod_folder_path': '',
     'mod_wids': '',
     'mod_names': '',
+    'metadata_provider': 'api',
+    'steam_api_url': 'https://api.steampowered.com',
+    'check_interval_hours': '0',
 }
 
 downloader_config = {
-    'batch_count': '5'
+    'batch_count': '5',
+    'workers': '1',
+    'session_mode': 'False',
+    'async_supervisor': 'False',
+    'retry_attempts': '3',
+    'retry_base_delay': '5',
+    'retry_max_delay': '120',
+    'resolve_workers': '8',
+    'expand_collections': 'True',
+    'cache_ttl_hours': '168',
+    'cache_max_entries': '10000',
+    'cache_bypass': 'False',
+    'adaptive_batching': 'False',
+    'target_batch_seconds': '120',
+    'max_batch_count': '50',
+    'pack_by_size': 'False',
+    'adaptive_bytes_per_second': '',
+    'adaptive_item_overhead': '',
+    'resume_downloads': 'True',
+    'skip_current': 'True',
+    'schedule_policy': 'input',
+    'stall_timeout': '300',
+    'copy_mode': 'False',
+    'copy_workers': '4',
+    'delta_sync': 'True',
+    'install_queue_size': '2',
+    'install_workers': '1',
+    'rename_mode': 'False',
 }
 
 class Config(ConfigParser):
@@ -88,6 +118,18 @@ class Config(ConfigParser):
         
         self.save()
 
+    def get_data_path(self, filename: str):
+        """
+        Gets the path of a data file that lives next to the config file.
+
+        Args:
+            filename (str): the name of the data file
+
+        Returns:
+            str: the path to the data file
+        """
+        return os.path.join(os.path.dirname(os.path.abspath(self.config_file)), filename)
+
     def get_game_info_from_config(self, game: str):
         """
         Gets the game info from the config file.
@@ -117,4 +159,36 @@ class Config(ConfigParser):
         for section in self.sections():
             if section not in self.default_sections:
                 game_list.append(section)
-        return game_list
\ No newline at end of file
+        return game_list
+
+    def get_game_from_appid(self, appid: str):
+        """
+        Gets the game section in the config file that has the given appid.
+
+        Args:
+            appid (str): the appid of the game
+
+        Returns:
+            str: the name of the game, or None if no game has that appid
+        """
+        for game in self.get_game_list_from_config():
+            if self.get(game, 'appid', fallback=None) == str(appid):
+                return game
+        return None
+
+    def get_appid_index(self):
+        """
+        Gets an index of the game sections in the config file by their appid.
+
+        Args:
+            None
+
+        Returns:
+            dict: the name of the game of each appid
+        """
+        index = {}
+        for game in self.get_game_list_from_config():
+            appid = self.get(game, 'appid', fallback=None)
+            if appid:
+                index.setdefault(appid, game)
+        return index
@@ -0,0 +1,177 @@
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Dict, Iterable, Iterator, Optional
+import re
+import time
+
+# the lines steamcmd reports its progress with
+LOGIN_OK_RE = re.compile(r"Logging in user .* to Steam Public\.\.\.OK")
+ITEM_STARTED_RE = re.compile(r"Downloading item (\d+)")
+ITEM_DOWNLOADED_RE = re.compile(r'Success\. Downloaded item (\d+) to "([^"]*)" \((\d+) bytes\)')
+ITEM_FAILED_RE = re.compile(r"ERROR! Download item (\d+) failed \(([^)]*)\)")
+# lines that carry nothing worth showing
+NOISE_RE = re.compile(r"Redirecting stderr to|-- type 'quit' to exit --|^(Steam>)+$")
+
+# the failure reason of the items a cancelled run never downloaded
+CANCELLED = 'Cancelled'
+
+
+@dataclass
+class SteamCMDEvent:
+    """
+    Base class for the events parsed from steamcmd output
+    """
+
+
+@dataclass
+class OutputLine(SteamCMDEvent):
+    line: str = ''
+
+
+@dataclass
+class LoginOk(SteamCMDEvent):
+    line: str = ''
+
+
+@dataclass
+class ItemStarted(SteamCMDEvent):
+    wid: str = ''
+    line: str = ''
+
+
+@dataclass
+class ItemDownloaded(SteamCMDEvent):
+    wid: str = ''
+    path: str = ''
+    size: int = 0
+    line: str = ''
+
+
+@dataclass
+class ItemFailed(SteamCMDEvent):
+    wid: str = ''
+    reason: str = ''
+    line: str = ''
+
+
+@dataclass
+class ProcessExit(SteamCMDEvent):
+    return_code: Optional[int] = None
+
+
+@dataclass
+class BatchEnd(SteamCMDEvent):
+    """
+    A batch of a persistent session is done and steamcmd is back at its prompt
+    """
+    return_code: int = 0
+
+
+class SteamCMDOutputParser:
+    """
+    Turns steamcmd output into typed events
+    """
+    @staticmethod
+    def parse_line(line: str) -> Optional[SteamCMDEvent]:
+        """
+        Parse a single line of output
+
+        Parameters
+        ----------
+        line : str
+            The line to parse
+
+        Returns
+        -------
+        event : SteamCMDEvent
+            The event of the line, or None for blank and noise lines
+        """
+        line = line.strip()
+        if not line or NOISE_RE.search(line):
+            return None
+
+        match = ITEM_DOWNLOADED_RE.search(line)
+        if match:
+            return ItemDownloaded(match.group(1), match.group(2), int(match.group(3)), line)
+        match = ITEM_FAILED_RE.search(line)
+        if match:
+            return ItemFailed(match.group(1), match.group(2), line)
+        match = ITEM_STARTED_RE.search(line)
+        if match:
+            return ItemStarted(match.group(1), line)
+        if LOGIN_OK_RE.search(line):
+            return LoginOk(line)
+        return OutputLine(line)
+
+    def iter_events(self, lines: Iterable[str]) -> Iterator[SteamCMDEvent]:
+        """
+        Parse a stream of output lines, yielding an event for each line that has one
+        """
+        for line in lines:
+            event = self.parse_line(line)
+            if event is not None:
+                yield event
+
+
+@dataclass
+class BatchResult:
+    """
+    The per item outcome of a steamcmd run, built from its events
+    """
+    return_code: Optional[int] = None
+    downloaded: Dict[str, int] = field(default_factory=dict)
+    failed: Dict[str, str] = field(default_factory=dict)
+
+    def add_event(self, event: SteamCMDEvent):
+        if isinstance(event, ItemDownloaded):
+            self.downloaded[event.wid] = event.size
+            self.failed.pop(event.wid, None)
+        elif isinstance(event, ItemFailed):
+            self.failed[event.wid] = event.reason
+        elif isinstance(event, (ProcessExit, BatchEnd)):
+            self.return_code = event.return_code
+
+
+class DownloadStats:
+    """
+    Running totals of a download run, fed by steamcmd events from every worker
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.started: float = time.time()
+        self.queued: int = 0
+        self.downloaded: int = 0
+        self.failed: int = 0
+        self.bytes: int = 0
+
+    def add_queued(self, count: int):
+        with self._lock:
+            self.queued += count
+
+    def add_event(self, event: SteamCMDEvent):
+        with self._lock:
+            if isinstance(event, ItemDownloaded):
+                self.downloaded += 1
+                self.bytes += event.size
+            elif isinstance(event, ItemFailed):
+                self.failed += 1
+
+    @property
+    def done(self) -> int:
+        return self.downloaded + self.failed
+
+    @property
+    def progress(self) -> int:
+        """
+        The percentage of queued items that have a result
+        """
+        return int(100 * self.done / self.queued) if self.queued else 0
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = time.time() - self.started
+        return self.bytes / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f'{self.downloaded} downloaded, {self.failed} failed, '
+                f'{self.bytes / 1024 ** 2:.1f} MB at {self.bytes_per_second / 1024 ** 2:.2f} MB/s')
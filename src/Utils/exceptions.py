@@ -9,4 +9,11 @@ class RemovedFromSteamException(Exception):
     def __init__(self, name):
         self.name = name
         self.message = f"{self.name} has been removed from Steam"
-        super().__init__(self.message)
\ No newline at end of file
+        super().__init__(self.message)
+
+class ModResolveException(Exception):
+    def __init__(self, url, reason):
+        self.url = url
+        self.reason = reason
+        self.message = f"Could not resolve {self.url}: {self.reason}"
+        super().__init__(self.message)
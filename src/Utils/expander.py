@@ -0,0 +1,69 @@
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .metadata import COLLECTION_FILETYPE, SteamAPIMetadataProvider
+
+
+class CollectionExpander:
+    """
+    Expands collections, including collections of collections, into one flat list of mods
+    """
+    def __init__(self, provider: SteamAPIMetadataProvider, batch_size: int = 50):
+        """
+        CollectionExpander class init
+
+        Parameters
+        ----------
+        provider : SteamAPIMetadataProvider
+            The api provider used for the collection and item lookups
+        batch_size : int
+            The number of collections to look up per request
+        """
+        self.provider = provider
+        self.batch_size: int = max(1, batch_size)
+
+    def expand(self, collection_ids: Iterable[str], known: Optional[Dict[str, str]] = None) -> List[Tuple[str, str]]:
+        """
+        Walk the collections breadth-first and return every mod in them once
+
+        Parameters
+        ----------
+        collection_ids : iterable
+            The workshop ids of the collections to expand
+        known : dict
+            Appids that are already known, keyed by wid. These items are not looked up again
+
+        Returns
+        -------
+        mods : list
+            An ordered, duplicate free list of (wid, appid) tuples
+        """
+        known = dict(known or {})
+        queue = deque(str(id_) for id_ in collection_ids)
+        seen = set(queue)
+        wids = []
+
+        while queue:
+            # fetch the next level of collections in batches
+            batch = [queue.popleft() for _ in range(min(self.batch_size, len(queue)))]
+            children = self.provider.get_collection_details(batch)
+
+            for collection_id in batch:
+                for wid, filetype in children.get(collection_id, []):
+                    if wid in seen:
+                        continue
+                    seen.add(wid)
+
+                    if filetype == COLLECTION_FILETYPE:
+                        queue.append(wid)
+                    else:
+                        wids.append(wid)
+
+        # only the items that weren't on the scanned page need their appid looked up
+        unknown = [wid for wid in wids if wid not in known]
+        if unknown:
+            for wid, metadata in self.provider.get_details(unknown).items():
+                if metadata.appid:
+                    known[wid] = metadata.appid
+
+        return [(wid, known[wid]) for wid in wids if wid in known]
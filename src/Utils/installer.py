@@ -0,0 +1,376 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import errno
+import hashlib
+import os
+import shutil
+import stat
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+# the linux ioctl that makes a copy-on-write clone of a file (btrfs, xfs, ...)
+FICLONE = 0x40049409
+
+RENAME = 'rename'
+REFLINK = 'reflink'
+HARDLINK = 'hardlink'
+COPY = 'copy'
+SYNC = 'sync'
+
+
+def file_hash(path: str, block_size: int = 1024 ** 2) -> bytes:
+    """
+    Get the blake2b hash of a file, read in blocks
+    """
+    h = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.digest()
+
+
+@dataclass
+class SyncReport:
+    """
+    What a delta sync changed in the destination
+    """
+    unchanged: int = 0
+    copied: int = 0
+    linked: int = 0
+    deleted: int = 0
+    bytes_written: int = 0
+
+    def __str__(self):
+        return (f'{self.copied} copied, {self.linked} linked, {self.deleted} deleted, '
+                f'{self.unchanged} unchanged, {self.bytes_written / 1024 ** 2:.1f} MB written')
+
+
+@dataclass
+class InstallResult:
+    """
+    How an item was installed
+    """
+    method: str
+    sync: Optional[SyncReport] = None
+
+    def __str__(self):
+        return f'{self.method}: {self.sync}' if self.sync else self.method
+
+
+class ModInstaller:
+    """
+    Installs a downloaded item into a mod folder. The new version is staged next to
+    the destination and swapped in with renames, so the destination is always either
+    the complete old version or the complete new one, never a half deleted folder.
+
+    In move mode the item is renamed into place when it is on the same filesystem.
+    In copy mode the download is kept and the files are reflinked where the filesystem
+    supports it, hardlinked where it doesn't, and copied in parallel chunks otherwise.
+
+    When files have to be written, an installed version is delta synced instead of
+    replaced: its unchanged files are hardlinked into the staged version and only the
+    files that changed are written
+    """
+    def __init__(
+        self,
+        copy_mode: bool = False,
+        copy_workers: int = 4,
+        chunk_size: int = 64 * 1024 ** 2,
+        delta_sync: bool = True,
+    ):
+        """
+        ModInstaller class init
+
+        Parameters
+        ----------
+        copy_mode : bool
+            Whether or not to keep the download and install a copy of it
+        copy_workers : int
+            The number of files, or chunks of large files, copied at once
+        chunk_size : int
+            The size in bytes of the chunks large files are copied in
+        delta_sync : bool
+            Whether or not to sync an installed version in copy mode and across filesystems
+        """
+        self.copy_mode: bool = copy_mode
+        self.copy_workers: int = max(1, copy_workers)
+        self.chunk_size: int = chunk_size
+        self.delta_sync: bool = delta_sync
+
+    @staticmethod
+    def get_temp_paths(dest: str) -> Tuple[str, str]:
+        """
+        Get the paths the new version is staged at and the old version is kept at during a swap
+        """
+        parent, name = os.path.split(os.path.normpath(dest))
+        return os.path.join(parent, f'.{name}.installing'), os.path.join(parent, f'.{name}.old')
+
+    def recover(self, dest: str):
+        """
+        Clean up after an install that was interrupted. An old version that was moved
+        aside but never replaced is put back
+        """
+        staging, backup = self.get_temp_paths(dest)
+        if os.path.exists(backup):
+            if os.path.exists(dest):
+                shutil.rmtree(backup, ignore_errors=True)
+            else:
+                os.replace(backup, dest)
+        if os.path.exists(staging):
+            shutil.rmtree(staging, ignore_errors=True)
+
+    def install(self, source: str, dest: str) -> InstallResult:
+        """
+        Install a downloaded item
+
+        Parameters
+        ----------
+        source : str
+            The workshop content dir of the item
+        dest : str
+            The folder the item is installed to, replaced or synced if it exists
+
+        Returns
+        -------
+        result : InstallResult
+            How the files got there, rename, reflink, hardlink, copy or sync
+        """
+        self.recover(dest)
+        # a rename writes nothing, everything else is cheaper as a sync of what changed
+        if self.delta_sync and os.path.isdir(dest) and (self.copy_mode or not self._same_filesystem(source, dest)):
+            report = self.sync(source, dest)
+            if not self.copy_mode:
+                shutil.rmtree(source)
+            return InstallResult(SYNC, report)
+
+        staging, _ = self.get_temp_paths(dest)
+        try:
+            method = self._stage(source, staging)
+            self._swap(staging, dest)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return InstallResult(method)
+
+    @staticmethod
+    def _same_filesystem(source: str, dest: str) -> bool:
+        return os.stat(source).st_dev == os.stat(os.path.dirname(os.path.normpath(dest))).st_dev
+
+    def sync(self, source: str, dest: str) -> SyncReport:
+        """
+        Make dest match source the way rsync does. A file is unchanged when its size and
+        modified time match, or when its size matches and its hash does. The new version is
+        staged like any install and swapped in: the unchanged files are hardlinked from dest,
+        the changed ones written from source and the ones that are gone left behind. No file
+        of dest is written to, so a file it shares with the download in copy mode never is
+
+        Parameters
+        ----------
+        source : str
+            The dir to sync from
+        dest : str
+            The dir to sync to
+
+        Returns
+        -------
+        report : SyncReport
+            The number of files and bytes written
+        """
+        staging, _ = self.get_temp_paths(dest)
+        try:
+            report = self._stage_sync(source, dest, staging)
+            self._swap(staging, dest)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return report
+
+    def _stage_sync(self, source: str, dest: str, staging: str) -> SyncReport:
+        """
+        Put the new version at the staging path, reusing the files of dest that didn't change
+        """
+        report = SyncReport()
+        files: List[Tuple[str, str, str]] = []
+        for root, dirs, names in os.walk(source):
+            rel_root = os.path.relpath(root, source)
+            os.makedirs(os.path.join(staging, rel_root), exist_ok=True)
+            for name in names:
+                rel = os.path.join(rel_root, name)
+                files.append((os.path.join(root, name), os.path.join(dest, rel), os.path.join(staging, rel)))
+
+        copies = []
+        for src, dst, staged in files:
+            # a filesystem without hardlinks gets the file written again
+            if self._unchanged(src, dst) and self._link(HARDLINK, dst, staged):
+                report.unchanged += 1
+            elif self.copy_mode and (self._link(REFLINK, src, staged) or self._link(HARDLINK, src, staged)):
+                report.linked += 1
+            else:
+                copies.append((src, staged))
+
+        self._copy_files(copies)
+        report.copied = len(copies)
+        report.bytes_written = sum(os.path.getsize(src) for src, _ in copies)
+
+        source_files = {os.path.normpath(os.path.relpath(src, source)) for src, _, _ in files}
+        for root, _, names in os.walk(dest):
+            rel_root = os.path.relpath(root, dest)
+            report.deleted += sum(os.path.normpath(os.path.join(rel_root, name)) not in source_files for name in names)
+
+        shutil.copystat(source, staging)
+        return report
+
+    @staticmethod
+    def _unchanged(src: str, dst: str) -> bool:
+        """
+        Check if dst already has the contents of src
+        """
+        try:
+            dst_stat = os.stat(dst)
+        except OSError:
+            return False
+        src_stat = os.stat(src)
+        if not stat.S_ISREG(dst_stat.st_mode) or src_stat.st_size != dst_stat.st_size:
+            return False
+        if os.path.samestat(src_stat, dst_stat) or src_stat.st_mtime_ns == dst_stat.st_mtime_ns:
+            return True
+
+        if file_hash(src) != file_hash(dst):
+            return False
+        # the next sync can trust the times again, unless the file is shared with another path
+        if dst_stat.st_nlink == 1:
+            shutil.copystat(src, dst)
+        return True
+
+    def _stage(self, source: str, staging: str) -> str:
+        """
+        Put the new version at the staging path
+        """
+        if not self.copy_mode:
+            try:
+                os.replace(source, staging)
+                return RENAME
+            except OSError as e:
+                # another filesystem, the files have to be copied
+                if e.errno != errno.EXDEV:
+                    raise
+            method = self._copy_tree(source, staging)
+            shutil.rmtree(source)
+            return method
+        return self._copy_tree(source, staging)
+
+    def _swap(self, staging: str, dest: str):
+        """
+        Swap the staged version in. A directory can't be renamed over a non empty one,
+        so the old version is moved aside first and put back if the swap fails
+        """
+        _, backup = self.get_temp_paths(dest)
+        if not os.path.exists(dest):
+            os.replace(staging, dest)
+            return
+
+        os.replace(dest, backup)
+        try:
+            os.replace(staging, dest)
+        except BaseException:
+            os.replace(backup, dest)
+            raise
+        shutil.rmtree(backup, ignore_errors=True)
+
+    def _copy_tree(self, source: str, staging: str) -> str:
+        """
+        Recreate the tree of source at staging, linking the files where possible
+
+        Returns
+        -------
+        method : str
+            The method used for the first file, reflink, hardlink or copy
+        """
+        files: List[Tuple[str, str]] = []
+        for root, dirs, names in os.walk(source):
+            target = os.path.join(staging, os.path.relpath(root, source))
+            os.makedirs(target, exist_ok=True)
+            for name in names:
+                files.append((os.path.join(root, name), os.path.join(target, name)))
+
+        method: Optional[str] = None
+        copies = []
+        for src, dst in files:
+            if method is None:
+                # the first file decides how the rest are installed
+                method = next((m for m in (REFLINK, HARDLINK) if self._link(m, src, dst)), COPY)
+                if method == COPY:
+                    copies.append((src, dst))
+            elif method == COPY or not self._link(method, src, dst):
+                copies.append((src, dst))
+
+        self._copy_files(copies)
+        shutil.copystat(source, staging)
+        return method or COPY
+
+    @staticmethod
+    def _link(method: str, src: str, dst: str) -> bool:
+        """
+        Try to reflink or hardlink a file, returning whether or not it worked
+        """
+        try:
+            if method == HARDLINK:
+                os.link(src, dst)
+                return True
+            if method == REFLINK and fcntl is not None:
+                with open(src, 'rb') as s, open(dst, 'wb') as d:
+                    fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                shutil.copystat(src, dst)
+                return True
+        except OSError:
+            if os.path.exists(dst):
+                os.remove(dst)
+        return False
+
+    def _copy_files(self, files: List[Tuple[str, str]]):
+        """
+        Copy files in parallel, splitting the large ones into chunks where the os can write at an offset
+        """
+        tasks = []
+        for src, dst in files:
+            size = os.path.getsize(src)
+            if size <= self.chunk_size or not hasattr(os, 'pwrite'):
+                tasks.append((src, dst, None, None))
+                continue
+            # the file is created at its full size so the chunks can be written in any order
+            with open(dst, 'wb') as f:
+                f.truncate(size)
+            tasks.extend((src, dst, offset, self.chunk_size) for offset in range(0, size, self.chunk_size))
+
+        with ThreadPoolExecutor(self.copy_workers) as executor:
+            for _ in executor.map(lambda task: self._copy_task(*task), tasks):
+                pass
+        for src, dst in files:
+            shutil.copystat(src, dst)
+
+    @staticmethod
+    def _copy_task(src: str, dst: str, offset: Optional[int], length: Optional[int]):
+        """
+        Copy a whole file, or one chunk of it
+        """
+        if offset is None:
+            shutil.copyfile(src, dst)
+            return
+
+        src_fd = os.open(src, os.O_RDONLY)
+        dst_fd = os.open(dst, os.O_WRONLY)
+        try:
+            end = offset + length
+            while offset < end:
+                data = os.pread(src_fd, min(1024 ** 2, end - offset), offset)
+                if not data:
+                    break
+                os.pwrite(dst_fd, data, offset)
+                offset += len(data)
+        finally:
+            os.close(src_fd)
+            os.close(dst_fd)
@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import time
+
+from .store import SQLiteStore
+
+JOURNALFILE = "download_journal.sqlite"
+
+QUEUED = 'queued'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+
+@dataclass
+class JournalEntry:
+    """
+    The state of one workshop item in the download journal
+    """
+    wid: str
+    appid: str
+    state: str = QUEUED
+    reason: str = ''
+    updated: Optional[float] = None
+
+
+class DownloadJournal(SQLiteStore):
+    """
+    Persistent sqlite journal of the items of a download run, so a run that dies
+    halfway can pick up the items that never finished
+    """
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS jobs ('
+        'wid TEXT PRIMARY KEY, appid TEXT NOT NULL, state TEXT NOT NULL, reason TEXT, updated REAL)',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state)',
+    )
+
+    def queue(self, items: Iterable[Tuple[str, str]]):
+        """
+        Record items as queued
+
+        Parameters
+        ----------
+        items : iterable
+            The (wid, appid) tuples to queue
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO jobs (wid, appid, state, reason, updated) VALUES (?, ?, ?, ?, ?)',
+                [(str(wid), str(appid), QUEUED, '', now) for wid, appid in items]
+            )
+
+    def mark(self, wids: Iterable[str], state: str, reason: str = ''):
+        """
+        Move items to another state
+
+        Parameters
+        ----------
+        wids : iterable
+            The wids to update
+        state : str
+            The new state
+        reason : str
+            Why the item is in that state, for failures
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'UPDATE jobs SET state = ?, reason = ?, updated = ? WHERE wid = ?',
+                [(state, reason, now, str(wid)) for wid in wids]
+            )
+
+    def mark_failed(self, failed: Dict[str, str]):
+        """
+        Record the failure reason of each wid
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'UPDATE jobs SET state = ?, reason = ?, updated = ? WHERE wid = ?',
+                [(FAILED, reason, now, str(wid)) for wid, reason in failed.items()]
+            )
+
+    def _select(self, where: str = '', params: tuple = ()) -> List[JournalEntry]:
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT wid, appid, state, reason, updated FROM jobs {where} ORDER BY updated', params
+            ).fetchall()
+        return [JournalEntry(*row) for row in rows]
+
+    def outstanding(self) -> List[JournalEntry]:
+        """
+        Get the items that were queued or downloading when the last run stopped
+        """
+        return self._select('WHERE state IN (?, ?)', (QUEUED, IN_PROGRESS))
+
+    def failed(self) -> List[JournalEntry]:
+        """
+        Get the items that failed for good
+        """
+        return self._select('WHERE state = ?', (FAILED,))
+
+    def prune(self):
+        """
+        Forget the items that are done
+        """
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM jobs WHERE state = ?', (DONE,))
@@ -0,0 +1,179 @@
+from dataclasses import dataclass, astuple, fields
+from typing import Dict, Iterable, List, Optional
+import time
+
+from .metadata import WorkshopMetadata
+from .store import SQLiteStore
+
+MANIFESTFILE = "mod_manifest.sqlite"
+
+
+@dataclass
+class ManifestEntry:
+    """
+    One installed mod in the manifest index
+    """
+    wid: str
+    appid: Optional[str] = None
+    game: Optional[str] = None
+    name: Optional[str] = None
+    install_path: Optional[str] = None
+    local_mtime: Optional[float] = None
+    remote_time_updated: Optional[float] = None
+    size: Optional[int] = None
+    removed: bool = False
+    last_checked: Optional[float] = None
+
+    def to_metadata(self) -> WorkshopMetadata:
+        """
+        The steam side of the entry as WorkshopMetadata
+        """
+        return WorkshopMetadata(
+            self.wid,
+            appid=self.appid,
+            title=self.name,
+            time_updated=self.remote_time_updated,
+            file_size=self.size,
+            removed=self.removed,
+        )
+
+
+COLUMNS = [f.name for f in fields(ManifestEntry)]
+
+
+class ManifestIndex(SQLiteStore):
+    """
+    Persistent sqlite index of the installed mods, one row per wid
+    """
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS mods ('
+        'wid TEXT PRIMARY KEY, appid TEXT, game TEXT, name TEXT, install_path TEXT, '
+        'local_mtime REAL, remote_time_updated REAL, size INTEGER, removed INTEGER NOT NULL DEFAULT 0, '
+        'last_checked REAL)',
+        'CREATE INDEX IF NOT EXISTS idx_mods_appid ON mods (appid)',
+        'CREATE INDEX IF NOT EXISTS idx_mods_last_checked ON mods (last_checked)',
+        # the revisions the downloader installed, kept apart so the update checker's rows don't overwrite them
+        'CREATE TABLE IF NOT EXISTS installed (wid TEXT PRIMARY KEY, time_updated REAL NOT NULL)',
+    )
+
+    def _select(self, where: str = '', params: tuple = ()) -> List[ManifestEntry]:
+        with self._lock:
+            rows = self._conn.execute(f'SELECT {", ".join(COLUMNS)} FROM mods {where}', params).fetchall()
+        return self._entries(rows)
+
+    @staticmethod
+    def _entries(rows: List[tuple]) -> List[ManifestEntry]:
+        entries = [ManifestEntry(*row) for row in rows]
+        for entry in entries:
+            entry.removed = bool(entry.removed)
+        return entries
+
+    def upsert_many(self, entries: Iterable[ManifestEntry]):
+        """
+        Insert or replace many entries in one transaction
+
+        Parameters
+        ----------
+        entries : iterable
+            The entries to write
+        """
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f'INSERT OR REPLACE INTO mods ({", ".join(COLUMNS)}) VALUES ({placeholders})',
+                [astuple(entry) for entry in entries]
+            )
+
+    def upsert(self, entry: ManifestEntry):
+        """
+        Insert or replace a single entry
+        """
+        self.upsert_many([entry])
+
+    def get(self, wid: str) -> Optional[ManifestEntry]:
+        """
+        Get the entry of a wid, or None if it isn't in the index
+        """
+        entries = self._select('WHERE wid = ?', (str(wid),))
+        return entries[0] if entries else None
+
+    def get_many(self, wids: Iterable[str]) -> Dict[str, ManifestEntry]:
+        """
+        Get the entries of many wids
+
+        Returns
+        -------
+        entries : dict
+            The entries that are in the index, keyed by wid
+        """
+        rows = self._select_in(f'SELECT {", ".join(COLUMNS)} FROM mods WHERE wid IN ({{}})', wids)
+        return {entry.wid: entry for entry in self._entries(rows)}
+
+    def get_by_appid(self, appid: str) -> List[ManifestEntry]:
+        """
+        Get every entry of an appid
+        """
+        return self._select('WHERE appid = ?', (str(appid),))
+
+    def get_by_game(self, game: str) -> List[ManifestEntry]:
+        """
+        Get every entry of a game section
+        """
+        return self._select('WHERE game = ?', (game,))
+
+    def stale(self, max_age_hours: float, game: Optional[str] = None) -> List[ManifestEntry]:
+        """
+        Get the entries that haven't been checked against steam in max_age_hours
+
+        Parameters
+        ----------
+        max_age_hours : float
+            How old a check can be before the entry is stale
+        game : str
+            Only return the entries of this game section
+
+        Returns
+        -------
+        entries : list
+            The stale entries, the ones that were never checked first
+        """
+        cutoff = time.time() - max_age_hours * 3600
+        where = 'WHERE (last_checked IS NULL OR last_checked < ?)'
+        params = (cutoff,)
+        if game is not None:
+            where += ' AND game = ?'
+            params += (game,)
+        return self._select(where + ' ORDER BY last_checked IS NOT NULL, last_checked', params)
+
+    def set_installed(self, revisions: Dict[str, float]):
+        """
+        Record the steam revisions of mods that were installed
+
+        Parameters
+        ----------
+        revisions : dict
+            The time_updated of the installed revision, keyed by wid
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO installed (wid, time_updated) VALUES (?, ?)',
+                [(str(wid), time_updated) for wid, time_updated in revisions.items()]
+            )
+
+    def get_installed(self, wids: Iterable[str]) -> Dict[str, float]:
+        """
+        Get the installed revisions of many wids
+
+        Returns
+        -------
+        revisions : dict
+            The time_updated of the installed revision of the wids that have one, keyed by wid
+        """
+        return dict(self._select_in('SELECT wid, time_updated FROM installed WHERE wid IN ({})', wids))
+
+    def remove(self, wids: Iterable[str]):
+        """
+        Remove the entries of wids that are no longer installed
+        """
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM mods WHERE wid = ?', [(str(wid),) for wid in wids])
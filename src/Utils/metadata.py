@@ -0,0 +1,339 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+import html as html_lib
+import re
+
+import requests
+from bs4 import BeautifulSoup
+
+if TYPE_CHECKING:
+    from .config import Config
+
+STEAM_API_URL = "https://api.steampowered.com"
+WORKSHOP_URL = "https://steamcommunity.com/sharedfiles/filedetails/?id={wid}"
+# the filetype GetCollectionDetails gives to children that are collections
+COLLECTION_FILETYPE = 2
+
+# the only parts of a workshop page the scraper needs
+TITLE_RE = re.compile(r"<title>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+APP_TAB_RE = re.compile(r"<a\s[^>]*\bapphub_sectionTab\b[^>]*>")
+HREF_RE = re.compile(r"href=\"([^\"]*)\"")
+APP_NAME_RE = re.compile(r"<div\s[^>]*\bapphub_AppName\b[^>]*>(.*?)</div>", re.DOTALL)
+STAT_RE = re.compile(r"<div class=\"detailsStatRight\">(.*?)</div>", re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+
+# the sizes on the workshop page look like "1.234 MB"
+SIZE_RE = re.compile(r"([\d.,]+)\s*([KMG]?B)", re.IGNORECASE)
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3}
+
+
+@dataclass
+class WorkshopMetadata:
+    """
+    The metadata of a single workshop item
+    """
+    wid: str
+    appid: Optional[str] = None
+    title: Optional[str] = None
+    game_name: Optional[str] = None
+    time_created: Optional[float] = None
+    time_updated: Optional[float] = None
+    file_size: Optional[int] = None
+    removed: bool = False
+
+
+def steam_time_to_epoch(time_str: str) -> float:
+    """
+    Convert a workshop page time string to epoch time
+
+    Parameters
+    ----------
+    time_str : str
+        A time like "Jun 22, 2016 @ 4:54am". The year is left out for the current year
+
+    Returns
+    -------
+    epoch_time : float
+        The time as seconds since the epoch
+    """
+    time_str = time_str.strip()
+    try:
+        return datetime.strptime(time_str, '%b %d, %Y @ %I:%M%p').timestamp()
+    except ValueError:
+        time_ = datetime.strptime(time_str, '%b %d @ %I:%M%p')
+        return time_.replace(year=datetime.now().year).timestamp()
+
+
+def size_to_bytes(size_str: str) -> Optional[int]:
+    """
+    Convert a workshop page size string like "1.234 MB" to bytes
+    """
+    match = SIZE_RE.search(size_str)
+    if not match:
+        return None
+    value, unit = match.groups()
+    return int(float(value.replace(',', '')) * SIZE_UNITS[unit.upper()])
+
+
+class MetadataProvider:
+    """
+    Base class for the workshop metadata backends
+    """
+    def __init__(self, session: Optional[requests.Session] = None, timeout: float = 30):
+        self.session = session or requests.Session()
+        self.timeout: float = timeout
+
+    def get_details(self, wids: Iterable[str]) -> Dict[str, WorkshopMetadata]:
+        """
+        Get the metadata of many workshop items
+
+        Parameters
+        ----------
+        wids : iterable
+            The workshop ids to look up
+
+        Returns
+        -------
+        details : dict
+            The WorkshopMetadata of each item keyed by wid
+        """
+        raise NotImplementedError
+
+
+class SteamAPIMetadataProvider(MetadataProvider):
+    """
+    Gets the metadata of many items per request from the Steam Web API's
+    GetPublishedFileDetails endpoint. No api key is needed for it
+    """
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        timeout: float = 30,
+        api_url: str = STEAM_API_URL,
+        batch_size: int = 100,
+    ):
+        """
+        SteamAPIMetadataProvider class init
+
+        Parameters
+        ----------
+        session : requests.Session
+            The session to make the requests with
+        timeout : float
+            The timeout in seconds for each request
+        api_url : str
+            The base url of the api. Can be pointed at a local server for testing
+        batch_size : int
+            The number of items to request at once
+        """
+        super().__init__(session, timeout)
+        self.api_url: str = api_url.rstrip('/')
+        self.batch_size: int = max(1, batch_size)
+
+    def _post(self, method: str, key: str, ids: List[str]) -> dict:
+        """
+        Post a list of ids to an ISteamRemoteStorage method and return its response
+        """
+        data = {key: len(ids)}
+        for i, id_ in enumerate(ids):
+            data[f'publishedfileids[{i}]'] = id_
+
+        resp = self.session.post(f'{self.api_url}/ISteamRemoteStorage/{method}/v1/', data=data, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp.json().get('response', {})
+
+    def get_details(self, wids: Iterable[str]) -> Dict[str, WorkshopMetadata]:
+        wids = [str(wid) for wid in wids]
+        details = {}
+        for i in range(0, len(wids), self.batch_size):
+            response = self._post('GetPublishedFileDetails', 'itemcount', wids[i:i + self.batch_size])
+            for item in response.get('publishedfiledetails', []):
+                metadata = self.parse_item(item)
+                details[metadata.wid] = metadata
+        return details
+
+    def get_collection_details(self, collection_ids: Iterable[str]) -> Dict[str, List[Tuple[str, int]]]:
+        """
+        Get the children of many collections from the GetCollectionDetails endpoint
+
+        Parameters
+        ----------
+        collection_ids : iterable
+            The workshop ids of the collections
+
+        Returns
+        -------
+        children : dict
+            A list of (wid, filetype) tuples in collection order, keyed by collection id.
+            A filetype of COLLECTION_FILETYPE means the child is a collection itself
+        """
+        collection_ids = [str(id_) for id_ in collection_ids]
+        children = {}
+        for i in range(0, len(collection_ids), self.batch_size):
+            response = self._post('GetCollectionDetails', 'collectioncount', collection_ids[i:i + self.batch_size])
+            for collection in response.get('collectiondetails', []):
+                if collection.get('result') != 1:
+                    continue
+                items = sorted(collection.get('children', []), key=lambda child: child.get('sortorder', 0))
+                children[str(collection['publishedfileid'])] = [
+                    (str(child['publishedfileid']), int(child.get('filetype', 0))) for child in items
+                ]
+        return children
+
+    @staticmethod
+    def parse_item(item: dict) -> WorkshopMetadata:
+        """
+        Convert one entry of publishedfiledetails to WorkshopMetadata
+        """
+        wid = str(item['publishedfileid'])
+        # any result other than 1 (OK) means the item is gone or hidden
+        if item.get('result') != 1:
+            return WorkshopMetadata(wid, removed=True)
+
+        return WorkshopMetadata(
+            wid,
+            appid=str(item['consumer_app_id']) if item.get('consumer_app_id') else None,
+            title=item.get('title'),
+            time_created=float(item['time_created']) if item.get('time_created') else None,
+            time_updated=float(item['time_updated']) if item.get('time_updated') else None,
+            file_size=int(item['file_size']) if item.get('file_size') else None,
+        )
+
+
+class ScraperMetadataProvider(MetadataProvider):
+    """
+    Gets the metadata of one item per request by scraping its workshop page
+    """
+    def get_details(self, wids: Iterable[str]) -> Dict[str, WorkshopMetadata]:
+        details = {}
+        for wid in wids:
+            resp = self.session.get(WORKSHOP_URL.format(wid=wid), timeout=self.timeout)
+            resp.raise_for_status()
+            details[str(wid)] = self.parse_page(str(wid), resp.text)
+        return details
+
+    @classmethod
+    def parse_page(cls, wid: str, html: str) -> WorkshopMetadata:
+        """
+        Parse a workshop page. The targeted scan is tried first and the full
+        soup is only built for pages it can't make sense of
+
+        Parameters
+        ----------
+        wid : str
+            The workshop id of the page
+        html : str
+            The page content
+
+        Returns
+        -------
+        metadata : WorkshopMetadata
+            The metadata on the page
+        """
+        metadata = cls.parse_page_fast(wid, html)
+        if metadata is None:
+            metadata = cls.parse_page_soup(wid, html)
+        return metadata
+
+    @staticmethod
+    def parse_page_fast(wid: str, html: str) -> Optional[WorkshopMetadata]:
+        """
+        Parse a workshop page by scanning for the title, the apphub_sectionTab link,
+        apphub_AppName and the detailsStatRight divs only
+
+        Returns
+        -------
+        metadata : WorkshopMetadata
+            The metadata on the page, or None if the scan can't read the page
+        """
+        title = TITLE_RE.search(html)
+        if not title:
+            return None
+
+        # the title looks like "Steam Workshop::Mod Name"
+        title = html_lib.unescape(title.group(1))
+        if '::' not in title:
+            return WorkshopMetadata(wid, removed=True)
+        metadata = WorkshopMetadata(wid, title=title.split('::')[1].strip())
+
+        app_tab = APP_TAB_RE.search(html)
+        if app_tab:
+            href = HREF_RE.search(app_tab.group(0))
+            if not href:
+                return None
+            metadata.appid = href.group(1).rstrip('/').split('/')[-1]
+        app_name = APP_NAME_RE.search(html)
+        if app_name:
+            metadata.game_name = html_lib.unescape(TAG_RE.sub('', app_name.group(1))).strip()
+
+        stats = [html_lib.unescape(TAG_RE.sub('', stat)) for stat in STAT_RE.findall(html)]
+        # a page without the stats the scan knows is left to the soup, it may only look different
+        if not stats:
+            return None
+        return ScraperMetadataProvider._apply_stats(metadata, stats)
+
+    @staticmethod
+    def parse_page_soup(wid: str, html: str) -> WorkshopMetadata:
+        """
+        Parse a workshop page by building the full soup
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+
+        # the title looks like "Steam Workshop::Mod Name"
+        title = soup.title.get_text() if soup.title else ''
+        if '::' not in title:
+            return WorkshopMetadata(wid, removed=True)
+        metadata = WorkshopMetadata(wid, title=title.split('::')[1].strip())
+
+        app_tab = soup.find('a', class_='apphub_sectionTab')
+        if app_tab:
+            metadata.appid = app_tab['href'].rstrip('/').split('/')[-1]
+        app_name = soup.find('div', class_='apphub_AppName')
+        if app_name:
+            metadata.game_name = app_name.get_text().strip()
+
+        stats = [stat.get_text() for stat in soup.find_all('div', class_='detailsStatRight')]
+        return ScraperMetadataProvider._apply_stats(metadata, stats)
+
+    @staticmethod
+    def _apply_stats(metadata: WorkshopMetadata, stats: List[str]) -> WorkshopMetadata:
+        """
+        Fill in the size and times from the detailsStatRight texts
+        """
+        # the stats are the size, the posted time and, if it has been updated, the updated time
+        if len(stats) == 0:
+            # if there's nothing in the stats, the mod has been removed from steam
+            metadata.removed = True
+            return metadata
+
+        metadata.file_size = size_to_bytes(stats[0])
+        if len(stats) >= 2:
+            metadata.time_created = steam_time_to_epoch(stats[1])
+        if len(stats) >= 3:
+            metadata.time_updated = steam_time_to_epoch(stats[2])
+        return metadata
+
+
+def get_metadata_provider(config: 'Config', session: Optional[requests.Session] = None) -> MetadataProvider:
+    """
+    Create the metadata provider chosen by [UPDATER] metadata_provider
+
+    Parameters
+    ----------
+    config : Config
+        The config object
+    session : requests.Session
+        An optional session to share with the provider
+
+    Returns
+    -------
+    provider : MetadataProvider
+        The metadata provider
+    """
+    name = config.get('UPDATER', 'metadata_provider', fallback='api')
+    if name == 'api':
+        return SteamAPIMetadataProvider(session, api_url=config.get('UPDATER', 'steam_api_url', fallback=STEAM_API_URL))
+    if name == 'scraper':
+        return ScraperMetadataProvider(session)
+    raise ValueError(f'Unknown metadata provider: {name}')
@@ -0,0 +1,359 @@
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+from xml.etree import ElementTree
+import os
+import re
+import time
+
+from .store import SQLiteStore
+
+if TYPE_CHECKING:
+    from .manifest import ManifestIndex
+    from .metadata import MetadataProvider
+
+NAMEFILE = "mod_names.sqlite"
+
+# project zomboid items hold one or more mods in a mods folder, each installed on its own
+ZOMBOID_APPID = '108600'
+
+ABOUT = 'about'
+TITLE = 'title'
+STEAM = 'steam'
+
+# characters windows doesn't allow in a folder name
+INVALID_CHARS_RE = re.compile(r'[<>:"/\\|?*\x00-\x1f]')
+# device names windows doesn't allow as a folder name, with or without an extension
+RESERVED_NAMES = {'CON', 'PRN', 'AUX', 'NUL'} | {f'{d}{i}' for d in ('COM', 'LPT') for i in range(1, 10)}
+
+
+def safe_folder_name(name: str) -> str:
+    """
+    Make a mod name usable as a folder name on every platform
+
+    Parameters
+    ----------
+    name : str
+        The name of the mod
+
+    Returns
+    -------
+    name : str
+        The name without the characters a folder name can't have, empty if nothing is left
+    """
+    name = INVALID_CHARS_RE.sub('_', name).strip().rstrip('. ')
+    stem, dot, extension = name.partition('.')
+    if stem.upper() in RESERVED_NAMES:
+        name = f'{stem}_{dot}{extension}'
+    return name
+
+
+def find_about_xml(content_path: str) -> Optional[str]:
+    """
+    Get the path of a mod's About/About.xml, matching the names in any case
+    """
+    path = content_path
+    for part in ('about', 'about.xml'):
+        try:
+            with os.scandir(path) as entries:
+                path = next((entry.path for entry in entries if entry.name.lower() == part), None)
+        except OSError:
+            return None
+        if path is None:
+            return None
+    return path if os.path.isfile(path) else None
+
+
+def read_about_name(content_path: str) -> Optional[str]:
+    """
+    Read the name of a mod from its About/About.xml, the way rimworld lays it out. The file
+    is parsed as a stream and the parse stops at the name, so a long description is never read
+
+    Parameters
+    ----------
+    content_path : str
+        The workshop content dir of the mod
+
+    Returns
+    -------
+    name : str
+        The <name> under the root element, None if there is no About.xml or it has no name
+    """
+    path = find_about_xml(content_path)
+    if path is None:
+        return None
+
+    depth = 0
+    try:
+        for event, element in ElementTree.iterparse(path, events=('start', 'end')):
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 1 and element.tag.lower() == 'name':
+                return (element.text or '').strip() or None
+            # drop what has been parsed
+            element.clear()
+    except (ElementTree.ParseError, OSError):
+        return None
+    return None
+
+
+class ModNameResolver(SQLiteStore):
+    """
+    Finds the folder names of mods for rename mode. A name comes from the mod's own metadata
+    (About/About.xml), then from the workshop titles the update checker cached in the manifest,
+    and only then from steam. Every name found is kept in a persistent sqlite wid -> name index,
+    so a mod's name is looked up once.
+
+    The index also records which folders every mod is installed in, so two mods with the same
+    name, like a fork that kept the original's About.xml, never get the same folder
+    """
+    SCHEMA = (
+        'CREATE TABLE IF NOT EXISTS names ('
+        'wid TEXT PRIMARY KEY, appid TEXT, name TEXT NOT NULL, source TEXT NOT NULL, updated REAL NOT NULL)',
+        # the folders are unique per game, a project zomboid item can have several
+        'CREATE TABLE IF NOT EXISTS folders ('
+        'appid TEXT NOT NULL, folder TEXT NOT NULL, wid TEXT NOT NULL, PRIMARY KEY (appid, folder))',
+        'CREATE INDEX IF NOT EXISTS idx_folders_wid ON folders (wid)',
+    )
+
+    def __init__(
+        self,
+        path: str,
+        manifest: Optional['ManifestIndex'] = None,
+        provider: Optional['MetadataProvider'] = None,
+    ):
+        """
+        ModNameResolver class init
+
+        Parameters
+        ----------
+        path : str
+            The path to the sqlite file of the name index
+        manifest : ManifestIndex
+            The manifest whose cached titles are used for the mods without local metadata, if any
+        provider : MetadataProvider
+            The provider the titles of the remaining mods are fetched from, if any
+        """
+        super().__init__(path)
+        self.manifest = manifest
+        self.provider = provider
+
+    def get_many(self, wids: Iterable[str]) -> Dict[str, str]:
+        """
+        Get the indexed names of many wids
+
+        Returns
+        -------
+        names : dict
+            The names that are in the index, keyed by wid
+        """
+        return dict(self._select_in('SELECT wid, name FROM names WHERE wid IN ({})', wids))
+
+    def set_many(self, names: Dict[str, Tuple[str, str, str]]):
+        """
+        Write names to the index
+
+        Parameters
+        ----------
+        names : dict
+            (appid, name, source) tuples keyed by wid
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO names (wid, appid, name, source, updated) VALUES (?, ?, ?, ?, ?)',
+                [(str(wid), appid, name, source, now) for wid, (appid, name, source) in names.items()]
+            )
+
+    def forget(self, wids: Iterable[str]):
+        """
+        Remove wids from the index, so their names are looked up again
+        """
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM names WHERE wid = ?', [(str(wid),) for wid in wids])
+
+    def resolve(self, items: List[Tuple[str, str, str]]) -> Dict[str, str]:
+        """
+        Get the name of every mod
+
+        Parameters
+        ----------
+        items : list
+            The (wid, appid, content path) tuples of the downloaded mods
+
+        Returns
+        -------
+        names : dict
+            The names keyed by wid, the mods without one are left out
+        """
+        names = self.get_many(wid for wid, _, _ in items)
+        found: Dict[str, Tuple[str, str, str]] = {}
+
+        missing = []
+        for wid, appid, content_path in items:
+            if wid in names:
+                continue
+            name = read_about_name(content_path)
+            if name:
+                found[wid] = (appid, name, ABOUT)
+            else:
+                missing.append((wid, appid))
+
+        if missing and self.manifest is not None:
+            entries = self.manifest.get_many(wid for wid, _ in missing)
+            for wid, appid in missing:
+                if wid in entries and entries[wid].name:
+                    found[wid] = (appid, entries[wid].name, TITLE)
+            missing = [(wid, appid) for wid, appid in missing if wid not in found]
+
+        # the network is only used for the names that aren't known locally
+        if missing and self.provider is not None:
+            try:
+                details = self.provider.get_details(wid for wid, _ in missing)
+            except Exception:
+                details = {}
+            for wid, appid in missing:
+                if wid in details and details[wid].title:
+                    found[wid] = (appid, details[wid].title, STEAM)
+
+        if found:
+            self.set_many(found)
+        names.update({wid: name for wid, (_, name, _) in found.items()})
+        return names
+
+    def get_install_folders(
+        self,
+        content_path: str,
+        wid: str,
+        appid: str,
+        name: Optional[str],
+        mod_folder_path: str,
+    ) -> List[Tuple[str, str]]:
+        """
+        Get the folders a downloaded mod is installed as in rename mode and claim them in the index
+
+        Parameters
+        ----------
+        content_path : str
+            The workshop content dir of the mod
+        wid : str
+            The wid of the mod
+        appid : str
+            The appid of the mod
+        name : str
+            The resolved name of the mod, if any
+        mod_folder_path : str
+            The mod folder of the game the folders are in
+
+        Returns
+        -------
+        folders : list
+            (source path, folder name) tuples. A project zomboid item gives one per mod in
+            its mods folder, anything else its content dir under its name, or its wid without one
+        """
+        sources = [(content_path, safe_folder_name(name or '') or wid)]
+        mods_path = os.path.join(content_path, 'mods')
+        if str(appid) == ZOMBOID_APPID and os.path.isdir(mods_path):
+            with os.scandir(mods_path) as entries:
+                sources = [(entry.path, entry.name) for entry in entries if entry.is_dir()] or sources
+        return self.claim_folders(wid, appid, sources, mod_folder_path)
+
+    def claim_folders(
+        self,
+        wid: str,
+        appid: str,
+        sources: List[Tuple[str, str]],
+        mod_folder_path: str,
+    ) -> List[Tuple[str, str]]:
+        """
+        Record the folders of a mod, moving it to "<name> (<wid>)", or its wid, when the
+        folder it asks for belongs to another mod. A folder belongs to another mod when the
+        index has it under another wid, or it exists and the index doesn't know it
+
+        Parameters
+        ----------
+        wid : str
+            The wid of the mod
+        appid : str
+            The appid of the mod
+        sources : list
+            (source path, folder name) tuples of the folders the mod asks for
+        mod_folder_path : str
+            The mod folder of the game the folders are in
+
+        Returns
+        -------
+        folders : list
+            The (source path, folder name) tuples with the folders the mod got
+        """
+        wid, appid = str(wid), str(appid)
+        folders = []
+        with self._lock, self._conn:
+            for source, name in sources:
+                for folder in dict.fromkeys((name, f'{name} ({wid})', wid)):
+                    row = self._conn.execute(
+                        'SELECT wid FROM folders WHERE appid = ? AND folder = ?', (appid, folder)
+                    ).fetchone()
+                    # a mod's own wid folder is always its own
+                    if row is None and folder != wid and os.path.exists(os.path.join(mod_folder_path, folder)):
+                        continue
+                    if row is None or row[0] == wid:
+                        break
+                folders.append((source, folder))
+
+            # the folders of an earlier version that aren't used anymore are forgotten
+            self._conn.execute('DELETE FROM folders WHERE wid = ?', (wid,))
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO folders (appid, folder, wid) VALUES (?, ?, ?)',
+                [(appid, folder, wid) for _, folder in folders]
+            )
+        return folders
+
+    def get_installed_path(self, wid: str, appid: str, mod_folder_path: str) -> Optional[str]:
+        """
+        Get the folder a mod is installed in, the first folder the index has for it that exists
+        or else its wid folder
+
+        Parameters
+        ----------
+        wid : str
+            The wid of the mod
+        appid : str
+            The appid of the mod
+        mod_folder_path : str
+            The mod folder of its game
+
+        Returns
+        -------
+        path : str
+            The path of the folder, None if the mod isn't installed
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT folder FROM folders WHERE wid = ? AND appid = ? ORDER BY folder', (str(wid), str(appid))
+            ).fetchall()
+        for folder in [row[0] for row in rows] + [str(wid)]:
+            path = os.path.join(mod_folder_path, folder)
+            if os.path.isdir(path):
+                return path
+        return None
+
+    def get_installed_paths(self, appid: str, mod_folder_path: str) -> Dict[str, str]:
+        """
+        Get the folders of every mod of a game the index has a folder for that exists
+
+        Returns
+        -------
+        paths : dict
+            The paths keyed by wid
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT wid, folder FROM folders WHERE appid = ? ORDER BY folder', (str(appid),)
+            ).fetchall()
+        paths = {}
+        for wid, folder in rows:
+            path = os.path.join(mod_folder_path, folder)
+            if wid not in paths and os.path.isdir(path):
+                paths[wid] = path
+        return paths
@@ -0,0 +1,198 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .exceptions import ModResolveException
+from .scanner import COLLECTION, PageScanner
+
+if TYPE_CHECKING:
+    from .cache import ResolutionCache
+    from .expander import CollectionExpander
+
+
+@dataclass
+class ResolveResult:
+    """
+    The outcome of resolving a single url
+    """
+    url: str
+    mods: List[Tuple[str, str]] = field(default_factory=list)
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class ModResolver:
+    """
+    Resolves workshop urls to (wid, appid) tuples with a bounded pool of workers
+    that all share one keep-alive session
+    """
+    def __init__(
+        self,
+        max_workers: int = 8,
+        timeout: float = 30,
+        cache: Optional['ResolutionCache'] = None,
+        expander: Optional['CollectionExpander'] = None,
+    ):
+        """
+        ModResolver class init
+
+        Parameters
+        ----------
+        max_workers : int
+            The maximum number of urls to resolve at once
+        timeout : float
+            The timeout in seconds for each page request
+        cache : ResolutionCache
+            An optional cache that is checked before any page is requested
+        expander : CollectionExpander
+            An optional expander used to walk nested collections
+        """
+        self.max_workers: int = max(1, max_workers)
+        self.timeout: float = timeout
+        self.cache: Optional['ResolutionCache'] = cache
+        self.expander: Optional['CollectionExpander'] = expander
+        self.scanner = PageScanner()
+
+        # one pooled connection per worker so the connections are kept alive between pages
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @staticmethod
+    def clean_url(url: str) -> str:
+        """
+        Strip whitespace and the &search parameter from a url
+
+        Parameters
+        ----------
+        url : str
+            The url to clean
+
+        Returns
+        -------
+        url : str
+            The cleaned url
+        """
+        return url.strip().split('&search')[0]
+
+    def resolve_url(self, url: str) -> List[Tuple[str, str]]:
+        """
+        Resolve a single url to the mods it points to
+
+        Parameters
+        ----------
+        url : str
+            A workshop item or collection url
+
+        Returns
+        -------
+        mods : list
+            A list of (wid, appid) tuples
+
+        Raises
+        ------
+        ModResolveException
+            If the page could not be fetched or has no workshop items on it
+        """
+        url = self.clean_url(url)
+        if self.cache:
+            mods = self.cache.get(url)
+            if mods is not None:
+                return mods
+
+        mods = self._resolve_page(url)
+        # an empty resolution is never cached, it would hide the url's mods for the whole ttl
+        if self.cache and mods:
+            self.cache.set(url, mods)
+        return mods
+
+    def _resolve_page(self, url: str) -> List[Tuple[str, str]]:
+        """
+        Request a page and scan it for workshop items
+        """
+        try:
+            resp = self.session.get(url, timeout=self.timeout, stream=True)
+        except requests.RequestException as e:
+            raise ModResolveException(url, f'Error getting page: {e}')
+
+        # the page is scanned as it downloads, a workshop item stops the download early
+        try:
+            resp.raise_for_status()
+            matches = list(self.scanner.scan_response(resp))
+        except requests.RequestException as e:
+            raise ModResolveException(url, f'Error getting page: {e}')
+        finally:
+            resp.close()
+
+        if not matches:
+            raise ModResolveException(url, 'No match')
+
+        # collection
+        if matches[0][0] == COLLECTION:
+            return self._expand_collection(url, [(wid, appid) for _, wid, appid in matches])
+
+        # workshop
+        _, wid, appid = matches[0]
+        return [(wid, appid)]
+
+    def _expand_collection(self, url: str, mods: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """
+        Expand the nested collections of a collection page. The items scanned from the
+        page are returned as they are if there is no expander or the expansion fails or is empty
+        """
+        collection_id = parse_qs(urlsplit(url).query).get('id', [None])[0]
+        if not self.expander or not collection_id:
+            return mods
+
+        try:
+            expanded = self.expander.expand([collection_id], known=dict(mods))
+        except (requests.RequestException, ValueError, KeyError):
+            return mods
+        # the api had nothing for the collection, the scanned page is all there is
+        return expanded or mods
+
+    def resolve_iter(self, urls: Iterable[str]) -> Iterator[ResolveResult]:
+        """
+        Resolve urls in parallel, yielding each result as soon as it is done.
+        A failing url is yielded with its error and does not stop the others.
+
+        Parameters
+        ----------
+        urls : iterable
+            The urls to resolve. Blank lines are skipped
+
+        Returns
+        -------
+        results : iterator
+            A ResolveResult for every url, in order of completion
+        """
+        urls = [url for url in (self.clean_url(u) for u in urls) if url]
+        if not urls:
+            return
+
+        executor = ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls)))
+        try:
+            futures = {executor.submit(self.resolve_url, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    yield ResolveResult(url, future.result())
+                except Exception as e:
+                    yield ResolveResult(url, error=e)
+        finally:
+            # a consumer that stops early, like a cancelled run, doesn't wait for the urls still queued
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        """
+        Close the shared session
+        """
+        self.session.close()
@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+from threading import Event
+from typing import Dict, List, Optional, Tuple
+import random
+import time
+
+
+@dataclass
+class RetryState:
+    """
+    The retry bookkeeping of one workshop item
+    """
+    wid: str
+    appid: str
+    attempts: int = 0
+    reason: str = ''
+    due: float = 0.0
+
+
+class RetryScheduler:
+    """
+    Collects the items that failed to download and hands them back in new batches
+    with exponential backoff and jitter, until they download or run out of attempts
+    """
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay: float = 5.0,
+        max_delay: float = 120.0,
+        jitter: float = 0.5,
+        batch_size: int = 5,
+    ):
+        """
+        RetryScheduler class init
+
+        Parameters
+        ----------
+        max_attempts : int
+            The number of download attempts an item gets, the first one included
+        base_delay : float
+            The delay in seconds before the first retry, doubled for every retry after it
+        max_delay : float
+            The longest delay in seconds between retries
+        jitter : float
+            The fraction the delay is randomly stretched or shrunk by, so retries don't line up
+        batch_size : int
+            The number of items per retry batch
+        """
+        self.max_attempts: int = max(1, max_attempts)
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.jitter: float = jitter
+        self.batch_size: int = max(1, batch_size)
+
+        self._attempts: Dict[str, int] = {}
+        self._pending: Dict[str, RetryState] = {}
+        self._failed: Dict[str, RetryState] = {}
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Get the delay before a retry
+
+        Parameters
+        ----------
+        attempt : int
+            The number of attempts the item has had so far
+
+        Returns
+        -------
+        delay : float
+            The delay in seconds
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def add_failures(self, failed: Dict[str, str], appids: Dict[str, str]):
+        """
+        Record the items that failed in an attempt and schedule their retries
+
+        Parameters
+        ----------
+        failed : dict
+            The failure reason of each wid
+        appids : dict
+            The appid of each wid
+        """
+        now = time.time()
+        for wid, reason in failed.items():
+            attempts = self._attempts.get(wid, 0) + 1
+            self._attempts[wid] = attempts
+            state = RetryState(wid, appids[wid], attempts, reason)
+
+            if attempts >= self.max_attempts:
+                self._failed[wid] = state
+            else:
+                state.due = now + self.backoff(attempts)
+                self._pending[wid] = state
+
+    @property
+    def pending(self) -> bool:
+        return bool(self._pending)
+
+    def next_due(self) -> Optional[float]:
+        """
+        Get the time the next retry is due, or None if nothing is waiting
+        """
+        return min((state.due for state in self._pending.values()), default=None)
+
+    def due_batches(self, now: Optional[float] = None) -> List[List[Tuple[str, str]]]:
+        """
+        Take the items whose retry is due and group them into batches
+
+        Parameters
+        ----------
+        now : float
+            The current time, time.time() if None
+
+        Returns
+        -------
+        batches : list
+            Lists of (wid, appid) tuples
+        """
+        now = time.time() if now is None else now
+        due = [state for state in self._pending.values() if state.due <= now]
+        for state in due:
+            del self._pending[state.wid]
+
+        items = [(state.wid, state.appid) for state in due]
+        return [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+    def wait(self, cancelled: Optional[Event] = None) -> bool:
+        """
+        Sleep until the next retry is due
+
+        Parameters
+        ----------
+        cancelled : threading.Event
+            Ends the wait early when it is set, if any
+
+        Returns
+        -------
+        cancelled : bool
+            Whether or not the wait ended because of the event
+        """
+        due = self.next_due()
+        delay = max(0.0, due - time.time()) if due is not None else 0.0
+        if cancelled is None:
+            time.sleep(delay)
+            return False
+        return cancelled.wait(delay)
+
+    def final_report(self) -> Dict[str, RetryState]:
+        """
+        Get the items that ran out of attempts
+
+        Returns
+        -------
+        failed : dict
+            The RetryState of every item that failed for good, keyed by wid
+        """
+        return dict(self._failed)
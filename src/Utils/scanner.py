@@ -0,0 +1,86 @@
+from typing import Iterable, Iterator, Tuple
+import re
+
+# the same patterns the pages were always scanned with, compiled once for raw bytes
+COLLECTION_ITEM_RE = re.compile(rb"SubscribeCollectionItem[\( ']+(\d+)[ ',]+(\d+)'")
+WORKSHOP_ITEM_RE = re.compile(rb"ShowAddToCollection[\( ']+(\d+)[ ',]+(\d+)'")
+
+COLLECTION = 'collection'
+WORKSHOP = 'workshop'
+
+
+class PageScanner:
+    """
+    Scans a workshop or collection page chunk by chunk for its (wid, appid) pairs,
+    so the page never has to be held in memory as a whole
+    """
+    def __init__(self, chunk_size: int = 16384, overlap: int = 256):
+        """
+        PageScanner class init
+
+        Parameters
+        ----------
+        chunk_size : int
+            The number of bytes to read at a time
+        overlap : int
+            The number of bytes carried over between chunks so a match split by a
+            chunk boundary is still found. Must be longer than a single match
+        """
+        self.chunk_size: int = chunk_size
+        self.overlap: int = overlap
+
+    def scan(self, chunks: Iterable[bytes]) -> Iterator[Tuple[str, str, str]]:
+        """
+        Scan the chunks of a page
+
+        Parameters
+        ----------
+        chunks : iterable
+            The page body in chunks of bytes
+
+        Returns
+        -------
+        matches : iterator
+            (kind, wid, appid) tuples where kind is COLLECTION or WORKSHOP. Collection
+            items are yielded as they are found. A workshop item ends the scan, so the
+            rest of the page is not read
+        """
+        buffer = b''
+        is_collection = False
+
+        for chunk in chunks:
+            buffer += chunk
+            scanned_to = 0
+
+            for match in COLLECTION_ITEM_RE.finditer(buffer):
+                is_collection = True
+                scanned_to = match.end()
+                yield COLLECTION, match.group(1).decode(), match.group(2).decode()
+
+            if not is_collection:
+                match = WORKSHOP_ITEM_RE.search(buffer)
+                if match:
+                    yield WORKSHOP, match.group(1).decode(), match.group(2).decode()
+                    return
+
+            # keep only the tail that could still hold the start of a match
+            buffer = buffer[max(scanned_to, len(buffer) - self.overlap):]
+
+    def scan_response(self, resp) -> Iterator[Tuple[str, str, str]]:
+        """
+        Scan a streamed requests response, closing it once the scan is done
+
+        Parameters
+        ----------
+        resp : requests.Response
+            A response requested with stream=True
+
+        Returns
+        -------
+        matches : iterator
+            The same tuples as scan
+        """
+        try:
+            yield from self.scan(resp.iter_content(chunk_size=self.chunk_size))
+        finally:
+            resp.close()
@@ -0,0 +1,139 @@
+from typing import Dict, List, Optional, Tuple
+import heapq
+
+INPUT = 'input'
+LARGEST_FIRST = 'largest_first'
+SMALLEST_FIRST = 'smallest_first'
+BINPACK = 'binpack'
+POLICIES = (INPUT, LARGEST_FIRST, SMALLEST_FIRST, BINPACK)
+
+
+class SizeScheduler:
+    """
+    Orders and packs the items of a download run by their size.
+
+    input keeps the order the items were resolved in, largest_first starts the
+    big items first so they don't end up alone at the tail of a parallel run,
+    smallest_first gets the most items done early, and binpack spreads the items
+    over batches of about the same number of bytes
+    """
+    def __init__(self, policy: str = INPUT):
+        """
+        SizeScheduler class init
+
+        Parameters
+        ----------
+        policy : str
+            One of input, largest_first, smallest_first or binpack
+        """
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown schedule policy: {policy}')
+        self.policy: str = policy
+
+    @staticmethod
+    def fill_sizes(items: List[Tuple[str, str]], sizes: Dict[str, int]) -> Dict[str, float]:
+        """
+        Get the size of every item, using the average known size for the items without one
+        """
+        known = [sizes[wid] for wid, _ in items if sizes.get(wid)]
+        average = sum(known) / len(known) if known else 0.0
+        return {wid: sizes.get(wid) or average for wid, _ in items}
+
+    def order(self, items: List[Tuple[str, str]], sizes: Dict[str, int]) -> List[Tuple[str, str]]:
+        """
+        Order the items for the policy. binpack orders them largest first, the order it packs them in
+
+        Parameters
+        ----------
+        items : list
+            The (wid, appid) tuples to order
+        sizes : dict
+            The known sizes in bytes keyed by wid
+
+        Returns
+        -------
+        items : list
+            The ordered (wid, appid) tuples
+        """
+        if self.policy == INPUT:
+            return list(items)
+
+        filled = self.fill_sizes(items, sizes)
+        # sorted is stable, so items of the same size keep their input order
+        return sorted(items, key=lambda item: filled[item[0]], reverse=self.policy != SMALLEST_FIRST)
+
+    def order_batches(
+        self,
+        batches: List[List[Tuple[str, str]]],
+        sizes: Dict[str, int],
+    ) -> List[List[Tuple[str, str]]]:
+        """
+        Order whole batches by their bytes for the policy, the way order does items
+
+        Parameters
+        ----------
+        batches : list
+            Lists of (wid, appid) tuples
+        sizes : dict
+            The known sizes in bytes keyed by wid
+
+        Returns
+        -------
+        batches : list
+            The ordered batches
+        """
+        if self.policy == INPUT:
+            return list(batches)
+
+        filled = self.fill_sizes([item for batch in batches for item in batch], sizes)
+        return sorted(
+            batches, key=lambda batch: sum(filled[wid] for wid, _ in batch), reverse=self.policy != SMALLEST_FIRST
+        )
+
+    def pack(
+        self,
+        items: List[Tuple[str, str]],
+        sizes: Dict[str, int],
+        batch_size: int,
+        batch_count: Optional[int] = None,
+    ) -> List[List[Tuple[str, str]]]:
+        """
+        Split the items into batches. binpack fills batch_count batches to about the same
+        number of bytes, the largest item first into the emptiest batch. The other policies
+        cut the ordered items into batches of batch_size
+
+        Parameters
+        ----------
+        items : list
+            The (wid, appid) tuples to batch
+        sizes : dict
+            The known sizes in bytes keyed by wid
+        batch_size : int
+            The number of items per batch
+        batch_count : int
+            The number of batches binpack fills, enough batches of batch_size if None
+
+        Returns
+        -------
+        batches : list
+            Lists of (wid, appid) tuples, the batch with the most bytes first for binpack
+        """
+        ordered = self.order(items, sizes)
+        batch_size = max(1, batch_size)
+        if self.policy != BINPACK:
+            return [ordered[i:i + batch_size] for i in range(0, len(ordered), batch_size)]
+
+        if not ordered:
+            return []
+        batch_count = batch_count or -(-len(ordered) // batch_size)
+        filled = self.fill_sizes(items, sizes)
+        batches: List[List[Tuple[str, str]]] = [[] for _ in range(min(batch_count, len(ordered)))]
+        # (bytes, batch index) of every batch, the emptiest on top
+        heap = [(0.0, i) for i in range(len(batches))]
+        for item in ordered:
+            total, i = heapq.heappop(heap)
+            batches[i].append(item)
+            heapq.heappush(heap, (total + filled[item[0]], i))
+
+        totals = dict((i, total) for total, i in heap)
+        return [batches[i] for i in sorted(totals, key=totals.get, reverse=True)]
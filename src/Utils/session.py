@@ -0,0 +1,186 @@
+from threading import Condition, Thread
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import os
+import subprocess
+
+from .acf import get_workshop_downloads_path
+from .events import (
+    CANCELLED, BatchEnd, BatchResult, ItemDownloaded, ItemFailed, ProcessExit, SteamCMDEvent, SteamCMDOutputParser
+)
+from .watchdog import WatchedProcess, kill_process_tree, popen_kwargs
+
+if TYPE_CHECKING:
+    from .utils import SteamCMD
+
+
+class SteamCMDSession:
+    """
+    Keeps one steamcmd process logged in and drives it over stdin, so a run of
+    many batches pays for the steamcmd start up and login only once
+    """
+    def __init__(self, steamcmd: 'SteamCMD', install_dir: Optional[str] = None, max_restarts: int = 2):
+        """
+        SteamCMDSession class init
+
+        Parameters
+        ----------
+        steamcmd : SteamCMD
+            The steamcmd object, used for its path and for reporting output
+        install_dir : str
+            The +force_install_dir of the session, steamcmd's own directory if None
+        max_restarts : int
+            How many times a batch restarts a dead process before giving up on it
+        """
+        self.steamcmd = steamcmd
+        self.install_dir = install_dir
+        self.max_restarts: int = max_restarts
+
+        self.proc: Optional[subprocess.Popen] = None
+        self._watched: Optional[WatchedProcess] = None
+        self._reader: Optional[Thread] = None
+        self._parser = SteamCMDOutputParser()
+        self._results: Dict[str, SteamCMDEvent] = {}
+        self._output_done: bool = False
+        self._condition = Condition()
+
+    @property
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None and not self._output_done
+
+    def start(self):
+        """
+        Start steamcmd and log in. The commands written after this wait in stdin until the login is done
+        """
+        args = [os.path.join(self.steamcmd.steamcmd_path, 'steamcmd.exe')]
+        if self.install_dir:
+            args.extend(['+force_install_dir', self.install_dir])
+        args.append('+login anonymous') # TODO: Add login
+
+        self._output_done = False
+        self.proc = subprocess.Popen(
+            args,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            errors='ignore',
+            bufsize=1,
+            **popen_kwargs(),
+        )
+        self._reader = Thread(target=self._read_output, args=(self.proc,), daemon=True)
+        self._reader.start()
+
+    def _read_output(self, proc: subprocess.Popen):
+        """
+        Read the output of the process, recording the result of every item
+        """
+        for event in self._parser.iter_events(proc.stdout):
+            watched = self._watched
+            if watched is not None:
+                self.steamcmd.watchdog.activity(watched)
+            self.steamcmd.handle_event(event)
+
+            # the result line of an item ends its workshop_download_item command
+            if isinstance(event, (ItemDownloaded, ItemFailed)):
+                with self._condition:
+                    self._results[event.wid] = event
+                    self._condition.notify_all()
+
+        # wake up anyone waiting on a process that is gone
+        with self._condition:
+            self._output_done = True
+            self._condition.notify_all()
+
+    def _send(self, command: str):
+        self.proc.stdin.write(command + '\n')
+        self.proc.stdin.flush()
+
+    def download_batch(self, batch: List[Tuple[str, str]], validate: bool = False) -> BatchResult:
+        """
+        Download a batch of mods. The process is (re)started if it isn't running
+
+        Parameters
+        ----------
+        batch : list
+            A list of (wid, appid) tuples
+        validate : bool
+            Whether or not steamcmd should validate the downloads
+
+        Returns
+        -------
+        result : BatchResult
+            The downloaded and failed items of the batch
+        """
+        remaining = list(batch)
+        result = BatchResult()
+        restarts = 0
+
+        while remaining and not self.steamcmd.cancelled.is_set():
+            if not self.alive:
+                if self.proc is not None:
+                    if restarts >= self.max_restarts:
+                        break
+                    restarts += 1
+                    self.steamcmd.report('SteamCMD stopped, restarting it', color='red')
+                self.start()
+
+            with self._condition:
+                for wid, _ in remaining:
+                    self._results.pop(wid, None)
+            # only a batch is watched, a session waiting for its next batch makes no progress but isn't
+            # hung. The watchdog kills the process when the batch hangs, the loop restarts it
+            self._watched = self.steamcmd.watchdog.watch(
+                self.proc, get_workshop_downloads_path(self.install_dir or self.steamcmd.steamcmd_path)
+            )
+            try:
+                for wid, appid in remaining:
+                    self._send(f'workshop_download_item {appid} {wid}' + (' validate' if validate else ''))
+            except OSError:
+                # the process died under us, the loop restarts it
+                kill_process_tree(self.proc)
+                self._reader.join()
+                self._unwatch()
+                continue
+
+            # wait until every item has a result or the process dies
+            with self._condition:
+                self._condition.wait_for(lambda: self._output_done or all(
+                    wid in self._results for wid, _ in remaining
+                ))
+                for wid, _ in remaining:
+                    if wid in self._results:
+                        result.add_event(self._results.pop(wid))
+            self._unwatch()
+            remaining = [
+                (wid, appid) for wid, appid in remaining if wid not in result.downloaded and wid not in result.failed
+            ]
+
+            # the process doesn't exit between batches, the prompt is back once every command has its
+            # result. An attempt whose process died ends with its return code
+            end_event = BatchEnd() if not remaining else ProcessExit(self.proc.wait())
+            result.add_event(end_event)
+            self.steamcmd.handle_event(end_event)
+
+        for wid, _ in remaining:
+            result.failed[wid] = CANCELLED if self.steamcmd.cancelled.is_set() else 'SteamCMD stopped'
+        return result
+
+    def _unwatch(self):
+        """
+        Stop watching the process once a batch is done
+        """
+        if self._watched is not None:
+            self.steamcmd.watchdog.unwatch(self._watched)
+            self._watched = None
+
+    def close(self):
+        """
+        Quit steamcmd
+        """
+        if self.alive:
+            try:
+                self._send('quit')
+                self.proc.wait(timeout=30)
+            except (OSError, subprocess.TimeoutExpired):
+                kill_process_tree(self.proc)
+        if self._reader:
+            self._reader.join(timeout=5)
@@ -0,0 +1,63 @@
+from typing import Iterable, List, Tuple
+from threading import Lock
+import sqlite3
+
+# sqlite limits the number of parameters of a query, IN (...) lookups are split in chunks this size
+MAX_PARAMS = 500
+
+
+class SQLiteStore:
+    """
+    Base of the persistent sqlite stores. Holds one connection that is shared by every thread
+    behind a lock, and creates the tables of the store on init
+    """
+    # the CREATE statements of the store's tables and indexes
+    SCHEMA: Tuple[str, ...] = ()
+
+    def __init__(self, path: str):
+        """
+        SQLiteStore class init
+
+        Parameters
+        ----------
+        path : str
+            The path to the sqlite file
+        """
+        self.path = path
+        self._lock = Lock()
+        # the stores are written to from the worker threads
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            for statement in self.SCHEMA:
+                self._conn.execute(statement)
+
+    def _select_in(self, query: str, values: Iterable[str]) -> List[tuple]:
+        """
+        Run a query with an IN (...) clause over many values
+
+        Parameters
+        ----------
+        query : str
+            The query, with {} where the placeholders of the IN clause go
+        values : iterable
+            The values of the IN clause
+
+        Returns
+        -------
+        rows : list
+            The rows of every chunk
+        """
+        values = [str(value) for value in values]
+        rows = []
+        with self._lock:
+            for i in range(0, len(values), MAX_PARAMS):
+                chunk = values[i:i + MAX_PARAMS]
+                rows += self._conn.execute(query.format(', '.join('?' for _ in chunk)), chunk).fetchall()
+        return rows
+
+    def close(self):
+        """
+        Close the sqlite connection
+        """
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,145 @@
+from concurrent.futures import Future
+from queue import Queue
+from threading import Thread
+from typing import TYPE_CHECKING, Any, Iterator, Optional, Tuple
+import asyncio
+
+from .acf import get_workshop_downloads_path
+from .events import ProcessExit, SteamCMDEvent, SteamCMDOutputParser
+from .watchdog import WatchedProcess, kill_process_tree, popen_kwargs
+
+if TYPE_CHECKING:
+    from .utils import SteamCMD
+
+# steamcmd's progress lines can be long, the asyncio default is 64 KiB
+STREAM_LIMIT = 2 ** 20
+
+
+class SteamCMDSupervisor:
+    """
+    Runs steamcmd processes as asyncio subprocesses on a single event loop thread.
+    The stdout and stderr of every process are read concurrently on that loop, so
+    neither pipe can fill up, and their events go into one merged stream of
+    (tag, event) tuples. Each process ends its part of the stream with a ProcessExit
+    """
+    def __init__(self, steamcmd: 'SteamCMD', events: Optional[Queue] = None):
+        """
+        SteamCMDSupervisor class init
+
+        Parameters
+        ----------
+        steamcmd : SteamCMD
+            The steamcmd object, used for its path and its watchdog
+        events : Queue
+            The queue the merged stream is put on, a new one if None
+        """
+        self.steamcmd = steamcmd
+        self._owns_events: bool = events is None
+        self.events: Queue = events if events is not None else Queue()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._thread: Optional[Thread] = None
+        self._parser = SteamCMDOutputParser()
+
+    def start(self):
+        """
+        Start the event loop thread
+        """
+        self.loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def run(self, args: list, install_dir: Optional[str] = None, tag: Any = None) -> Future:
+        """
+        Start a steamcmd process on the loop
+
+        Parameters
+        ----------
+        args : list
+            The args to run steamcmd with
+        install_dir : str
+            The +force_install_dir in the args, if any. Its downloads dir is watched for progress
+        tag : any
+            What the events of the process are tagged with in the merged stream
+
+        Returns
+        -------
+        future : Future
+            Resolves to the return code of the process, None if it couldn't be started
+        """
+        return asyncio.run_coroutine_threadsafe(self._run(args, install_dir, tag), self.loop)
+
+    async def _run(self, args: list, install_dir: Optional[str], tag: Any) -> Optional[int]:
+        """
+        Run a process until it exits, always ending its part of the stream with a ProcessExit
+        """
+        return_code = None
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                limit=STREAM_LIMIT,
+                **popen_kwargs(),
+            )
+            watched = self.steamcmd.watchdog.watch(
+                proc, get_workshop_downloads_path(install_dir or self.steamcmd.steamcmd_path), loop=self.loop
+            )
+            try:
+                await asyncio.gather(
+                    self._read(proc.stdout, tag, watched),
+                    self._read(proc.stderr, tag, watched),
+                )
+                return_code = await proc.wait()
+            finally:
+                self.steamcmd.watchdog.unwatch(watched)
+                # a pipe that couldn't be read, like a line over STREAM_LIMIT, would leave
+                # the process running with nobody reading its output
+                if proc.returncode is None:
+                    kill_process_tree(proc)
+                    return_code = await proc.wait()
+        except Exception as e:
+            self.steamcmd.report(f'SteamCMD could not be run: {e}', color='red')
+        finally:
+            self.events.put((tag, ProcessExit(return_code)))
+        return return_code
+
+    async def _read(self, stream: asyncio.StreamReader, tag: Any, watched: WatchedProcess):
+        """
+        Put the events of one pipe on the merged stream until it closes
+        """
+        async for raw in stream:
+            event = self._parser.parse_line(raw.decode(errors='ignore'))
+            if event is not None:
+                self.steamcmd.watchdog.activity(watched)
+                self.events.put((tag, event))
+
+    def iter_events(self) -> Iterator[Tuple[Any, SteamCMDEvent]]:
+        """
+        Iterate over the merged stream until the supervisor is closed. Only for a
+        supervisor that owns its queue
+        """
+        while True:
+            item = self.events.get()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        """
+        Stop the event loop once its processes are done and end the merged stream
+        """
+        if self.loop is None:
+            return
+
+        async def drain():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run_coroutine_threadsafe(drain(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+        self.loop = None
+        if self._owns_events:
+            self.events.put(None)
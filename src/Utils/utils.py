@@ -1,18 +1,32 @@
-from threading import Thread
-from typing import TYPE_CHECKING, Optional
+from threading import Event, Thread
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 import os
 from io import BytesIO
 from zipfile import ZipFile
 import requests
-import re
-import math
 import subprocess
 from PyQt6.QtWidgets import QMessageBox
 import sys
 
 from dataclasses import dataclass
 
-from src.Utils import SteamCMDNotInstalledException
+from src.Utils import SteamCMDNotInstalledException, ModResolveException, ModResolver, ResolutionCache
+from src.Utils import CollectionExpander, SteamAPIMetadataProvider, AdaptiveBatcher, SizeScheduler
+from src.Utils.scheduling import BINPACK, INPUT
+from src.Utils.cache import CACHEFILE
+from src.Utils.journal import JOURNALFILE, QUEUED, DownloadJournal
+from src.Utils.metadata import STEAM_API_URL
+from src.Utils.acf import InstalledItem, get_workshop_downloads_path, read_all_installed_items
+from src.Utils.installer import ModInstaller
+from src.Utils.manifest import MANIFESTFILE, ManifestIndex
+from src.Utils.names import NAMEFILE, ModNameResolver
+from src.Utils.watchdog import ProcessWatchdog, WatchedProcess, popen_kwargs
+from src.Utils.workers import SteamCMDWorkerPool, WorkerResult
+from src.Utils.retry import RetryScheduler
+from src.Utils.events import (
+    CANCELLED, BatchEnd, BatchResult, DownloadStats, ItemDownloaded, ItemFailed, LoginOk, ProcessExit, SteamCMDEvent,
+    SteamCMDOutputParser
+)
 
 if TYPE_CHECKING:
     from downloader import ModDownloader
@@ -34,6 +48,73 @@ class SteamCMD:
         """
         self.config = mod_downloader.config
         self.batch_size: int = int(self.config.get('DOWNLOADER', 'batch_count', fallback=5))
+        self.workers: int = int(self.config.get('DOWNLOADER', 'workers', fallback=1))
+        self.session_mode: bool = self.config.getboolean('DOWNLOADER', 'session_mode', fallback=False)
+        self.async_supervisor: bool = self.config.getboolean('DOWNLOADER', 'async_supervisor', fallback=False)
+        # downloaded batches wait in bounded queues to be verified and installed
+        self.install_queue_size: int = int(self.config.get('DOWNLOADER', 'install_queue_size', fallback=2))
+        self.install_workers: int = int(self.config.get('DOWNLOADER', 'install_workers', fallback=1))
+        self.retry_attempts: int = int(self.config.get('DOWNLOADER', 'retry_attempts', fallback=3))
+        self.retry_base_delay: float = float(self.config.get('DOWNLOADER', 'retry_base_delay', fallback=5))
+        self.retry_max_delay: float = float(self.config.get('DOWNLOADER', 'retry_max_delay', fallback=120))
+        self.parser = SteamCMDOutputParser()
+        self.stats = DownloadStats()
+        # stuck processes are killed and their items retried, cancel kills every process
+        self.stall_timeout: float = float(self.config.get('DOWNLOADER', 'stall_timeout', fallback=300))
+        self.watchdog = ProcessWatchdog(self.stall_timeout, on_stall=self._on_stall)
+        self.cancelled = Event()
+        self._download_thread: Optional[Thread] = None
+        # copy mode keeps steamcmd's download and installs a copy of it
+        self.installer = ModInstaller(
+            copy_mode=self.config.getboolean('DOWNLOADER', 'copy_mode', fallback=False),
+            copy_workers=int(self.config.get('DOWNLOADER', 'copy_workers', fallback=4)),
+            delta_sync=self.config.getboolean('DOWNLOADER', 'delta_sync', fallback=True),
+        )
+        self.resolve_cache = ResolutionCache(
+            self.config.get_data_path(CACHEFILE),
+            ttl_hours=float(self.config.get('DOWNLOADER', 'cache_ttl_hours', fallback=168)),
+            max_entries=int(self.config.get('DOWNLOADER', 'cache_max_entries', fallback=10000)),
+            bypass=self.config.getboolean('DOWNLOADER', 'cache_bypass', fallback=False),
+        )
+        self.resolver = ModResolver(
+            int(self.config.get('DOWNLOADER', 'resolve_workers', fallback=8)),
+            cache=self.resolve_cache,
+        )
+        # nested collections and item sizes come from the web api, sharing the resolver's session
+        self.metadata_provider = SteamAPIMetadataProvider(
+            self.resolver.session,
+            api_url=self.config.get('UPDATER', 'steam_api_url', fallback=STEAM_API_URL),
+        )
+        if self.config.getboolean('DOWNLOADER', 'expand_collections', fallback=True):
+            self.resolver.expander = CollectionExpander(self.metadata_provider)
+        # rename mode installs mods in folders named after them instead of their wid
+        self.rename_mode: bool = self.config.getboolean('DOWNLOADER', 'rename_mode', fallback=False)
+        # the manifest also records the revision of every mod the downloader installed
+        self.manifest = ManifestIndex(self.config.get_data_path(MANIFESTFILE))
+        self.name_resolver = ModNameResolver(
+            self.config.get_data_path(NAMEFILE),
+            manifest=self.manifest,
+            provider=self.metadata_provider,
+        )
+
+        # batch sizes follow the measured throughput, starting from what the last run measured
+        self.batcher: Optional[AdaptiveBatcher] = None
+        self.pack_by_size: bool = self.config.getboolean('DOWNLOADER', 'pack_by_size', fallback=False)
+        self.item_sizes: Dict[str, int] = {}
+        self.skip_current: bool = self.config.getboolean('DOWNLOADER', 'skip_current', fallback=True)
+        self.scheduler = SizeScheduler(self.config.get('DOWNLOADER', 'schedule_policy', fallback=INPUT))
+        if self.config.getboolean('DOWNLOADER', 'adaptive_batching', fallback=False):
+            self.batcher = AdaptiveBatcher(
+                self.batch_size,
+                target_seconds=float(self.config.get('DOWNLOADER', 'target_batch_seconds', fallback=120)),
+                max_size=int(self.config.get('DOWNLOADER', 'max_batch_count', fallback=50)),
+            )
+            self.batcher.load(self.config)
+
+        # the journal lets a run that died halfway pick up where it stopped
+        self.journal: Optional[DownloadJournal] = None
+        if self.config.getboolean('DOWNLOADER', 'resume_downloads', fallback=True):
+            self.journal = DownloadJournal(self.config.get_data_path(JOURNALFILE))
         
         self._mod_downloader: 'ModDownloader' = mod_downloader
         self.downloader_tab = None
@@ -55,6 +136,9 @@ class SteamCMD:
         
         print(f'appid: {self.appid}')
         print(f'mod_folder_path: {self.mod_folder_path}')
+
+        # the mods of the other games in the config are installed to their own mod folders
+        self.game_index: Dict[str, str] = self.config.get_appid_index()
         
         # check if steamcmd is installed
         self.check_for_steamcmd()
@@ -73,6 +157,46 @@ class SteamCMD:
         """
         self._steamcmd_installed = value
     
+    def get_mod_folder_path(self, appid: str) -> Optional[str]:
+        """
+        Get the mod folder the mods of an appid are installed to
+
+        Parameters
+        ----------
+        appid : str
+            The appid of the game
+
+        Returns
+        -------
+        mod_folder_path : str
+            The mod folder of the game in the config with that appid, None if there is none
+        """
+        if self.appid and str(appid) == self.appid:
+            return self.mod_folder_path
+        game = self.game_index.get(str(appid))
+        return self.config.get(game, 'mod_folder_path', fallback=None) if game else None
+
+    def get_installed_items(self, appid: Optional[str] = None) -> Dict[str, InstalledItem]:
+        """
+        Get the workshop items steamcmd has installed for an appid, read from the appworkshop acfs of
+        steamcmd and of every worker sandbox
+
+        Parameters
+        ----------
+        appid : str
+            The appid of the game. Defaults to the selected game
+
+        Returns
+        -------
+        items : dict
+            The InstalledItem of each installed item keyed by wid
+        """
+        appid = appid or self.appid
+        if not appid or not self.steamcmd_path:
+            return {}
+
+        return read_all_installed_items(self.steamcmd_path, appid)
+
     def check_for_steamcmd(self):
         """
         Check if steamcmd is installed and also if it is a fresh installation
@@ -199,47 +323,21 @@ class SteamCMD:
 
         Returns
         -------
-        mod_info : dict
-            The mod info
+        mod_info : list
+            A list of (wid, appid) tuples, or None if the url could not be resolved
         """
-        tuple_list = []
-        # if the url has the &search parameter, remove it
-        if re.search(r'&search', url):
-            url = url.split('&search')[0]
-
-        # try to get the page
         try:
-            x = requests.get(url)
-        except Exception as e:
-            print(f'Error getting page: {e}')
-            if self._mod_downloader.ui_running:
-                self.add_text_to_console(f'Error getting page: {e}', color='red')
+            tuple_list = self.resolver.resolve_url(url)
+        except ModResolveException as e:
+            self.report(e.message, color='red')
             return None
-        
-        # collection
-        if re.search("SubscribeCollectionItem", x.text):
-            dls = re.findall(r"SubscribeCollectionItem[\( ']+(\d+)[ ',]+(\d+)'", x.text)
-            for wid, appid in dls:
-                print(f'wid: {wid}, appid: {appid}')
-                tuple_list.append((wid, appid))
-
-        # workshop
-        elif re.search("ShowAddToCollection", x.text):
-            wid, appid = re.findall(r"ShowAddToCollection[\( ']+(\d+)[ ',]+(\d+)'", x.text)[0]
-            print(f'wid: {wid}, appid: {appid}')
-            tuple_list.append((wid, appid))
 
-        else:
-            print('No match')
-            if self._mod_downloader.ui_running:
-                self.add_text_to_console('No match', color='red')
-            return None
-        
         return tuple_list
 
-    def download_mods_list(self, mod_list: list):
+    def download_mods_list(self, mod_list: list) -> Thread:
         """
-        Download a list of mods
+        Download a list of mods on a background thread, so resolving the urls and
+        checking which mods are current doesn't block the ui
 
         Parameters
         ----------
@@ -248,53 +346,475 @@ class SteamCMD:
 
         Returns
         -------
-        success : bool
-            Whether or not the download was successful
+        thread : Thread
+            The thread of the download, done once every mod is installed or has failed
         """
-        # get the wids and appid for each of the mods
-        download_list = []
-        for url in mod_list:
-            download_list.append(self.get_mod_info_from_url(url))
-        
-        dl_length = len(download_list)
-        batch_limit = math.ceil(dl_length / self.batch_size)
-        # get the number of batches
-        if dl_length % self.batch_size == 0:
-            batch_limit = dl_length // self.batch_size
-        else:
-            batch_limit = (dl_length // self.batch_size) + 1
+        # cleared here, so a cancel right after the start isn't lost
+        self.cancelled.clear()
+        t = Thread(target=self._download_mods_list, args=(list(mod_list),), daemon=True)
+        t.start()
+        self._download_thread = t
+        return t
 
-        all_batches = []
+    def _download_mods_list(self, mod_list: list) -> list:
+        """
+        Download a list of mods. The urls are resolved in parallel and each batch
+        is started as soon as enough mods have been resolved to fill it
 
-        # download the mods in batches
-        for i in range(batch_limit):
-            # get the batch
-            batch = download_list[i * self.batch_size : (i + 1) * self.batch_size]
-            batch_count = len(batch)
-            all_batches.append(batch)
-            print(f'Batch {i + 1} of {batch_limit} ({batch_count} mods)')
+        Parameters
+        ----------
+        mod_list : list
+            A list of urls to download mods from
 
-            # build the args list
-            args = [os.path.join(self.steamcmd_path, 'steamcmd.exe')]
-            args.append('+login anonymous') # TODO: Add login
-            # args.append(f'+force_install_dir {self.mod_folder_path}')
+        Returns
+        -------
+        failed : list
+            The ResolveResults of the urls that could not be resolved
+        """
+        pending: Dict[str, list] = {}
+        failed = []
+        seen = set()
+        resolved = 0
+        skipped = 0
+        batch_number = 0
+
+        # the workers start downloading while the rest of the urls are still resolving
+        self.stats = DownloadStats()
+        self.item_sizes = {}
+        pool = SteamCMDWorkerPool(
+            self, self.workers, session_mode=self.session_mode, batcher=self.batcher, journal=self.journal,
+            async_mode=self.async_supervisor, queue_size=self.install_queue_size,
+            install_workers=self.install_workers,
+        )
+        try:
+            # every batch holds the mods of a single appid
+            for wid, appid in self.resume_outstanding(pool, seen):
+                pending.setdefault(appid, []).append((wid, appid))
+            pool.start()
 
-            for i in batch: # batch is a list of tuples
-                for wid, appid in i: # i is a tuple
-                    args.append(f'+workshop_download_item {appid} {wid}')
+            for result in self.resolver.resolve_iter(mod_list):
+                if self.cancelled.is_set():
+                    break
+                resolved += 1
+                if not result.ok:
+                    # report the url and carry on with the rest
+                    failed.append(result)
+                    self.report(str(result.error), color='red')
+                    continue
+
+                # the same mod can be in several of the collections
+                new = []
+                for wid, appid in result.mods:
+                    if wid in seen:
+                        continue
+                    seen.add(wid)
+                    new.append((wid, appid))
+                # only new and changed mods are downloaded
+                if self.skip_current:
+                    new, current = self.preflight(new)
+                    skipped += len(current)
+                if self.batcher and self.pack_by_size:
+                    self.get_item_sizes([wid for wid, _ in new])
+                if self.journal:
+                    self.journal.queue(new)
+                for wid, appid in new:
+                    pending.setdefault(appid, []).append((wid, appid))
+
+                # queue every full batch right away, unless the batches are planned by size
+                if self.scheduler.policy != INPUT:
+                    continue
+                for appid in dict.fromkeys(appid for _, appid in new):
+                    batches, pending[appid] = self.take_batches(pending[appid])
+                    for batch in batches:
+                        batch_number += 1
+                        self.download_batch(pool, batch, batch_number)
+
+            # the size policies need every size before the first batch is queued
+            if self.scheduler.policy != INPUT:
+                self.get_item_sizes([wid for items in pending.values() for wid, _ in items])
+
+            # whatever is left over goes in the last batches
+            batches = []
+            for items in pending.values():
+                batches.extend(self.take_batches(items, final=True)[0])
+            # the batches of every appid are ordered together
+            if self.scheduler.policy != INPUT:
+                batches = self.scheduler.order_batches(batches, self.item_sizes)
+            for batch in batches:
+                batch_number += 1
+                self.download_batch(pool, batch, batch_number)
+
+            if skipped:
+                self.report(f'{skipped} mod(s) are already up to date and were skipped', color='green')
+            if failed:
+                self.report(f'{len(failed)} of {resolved} url(s) could not be resolved', color='red')
+        except Exception as e:
+            self.report(f'The download stopped: {e}', color='red')
+        finally:
+            # the mods that were queued are still downloaded and the ui is reset
+            pool.close()
+            self._wait_for_pool(pool)
+        return failed
+
+    def resume_outstanding(self, pool: SteamCMDWorkerPool, seen: set) -> list:
+        """
+        Get the mods the journal says the last run didn't finish. Mods that finished downloading
+        into a worker sandbox before the run stopped are installed from there instead of downloaded again
+
+        Parameters
+        ----------
+        pool : SteamCMDWorkerPool
+            The worker pool of the new run
+        seen : set
+            The wids of the run, updated with the resumed wids
+
+        Returns
+        -------
+        items : list
+            The (wid, appid) tuples that still have to be downloaded
+        """
+        if not self.journal:
+            return []
+
+        # the mods of games that aren't in the config wait until one is selected
+        items = [
+            (entry.wid, entry.appid) for entry in self.journal.outstanding()
+            if not self.appid or self.get_mod_folder_path(entry.appid)
+        ]
+        if not items:
+            return []
+
+        self.report(f'Resuming {len(items)} mod(s) the last run did not finish', color='yellow')
+        recovered = pool.recover(items)
+        if recovered:
+            self.report(f'{len(recovered)} of them were already downloaded', color='green')
+
+        seen.update(wid for wid, _ in items)
+        return [(wid, appid) for wid, appid in items if wid not in recovered]
+
+    def preflight(self, items: list) -> Tuple[list, list]:
+        """
+        Split off the mods whose installed revision is already the newest one on steam. A mod is
+        current when it is in the mod folder of its game and the revision recorded when it was
+        installed, or its folder's modified time, isn't older than its steam time_updated. The
+        appworkshop acfs aren't used, they list what was downloaded even if the install failed
+
+        Parameters
+        ----------
+        items : list
+            The (wid, appid) tuples to check
+
+        Returns
+        -------
+        items : list
+            The (wid, appid) tuples that are new or changed
+        current : list
+            The wids that are up to date
+        """
+        installed_paths = {}
+        for wid, appid in items:
+            mod_folder_path = self.get_mod_folder_path(appid)
+            # a mod installed in rename mode is in a folder named after it
+            path = self.name_resolver.get_installed_path(wid, appid, mod_folder_path) if mod_folder_path else None
+            if path:
+                installed_paths[wid] = path
+        if not installed_paths:
+            return items, []
+
+        try:
+            details = self.metadata_provider.get_details(list(installed_paths))
+        except Exception as e:
+            # without the steam side everything is downloaded, as before
+            self.report(f'Could not check {len(installed_paths)} mod(s) for updates: {e}', color='red')
+            return items, []
+
+        revisions = self.manifest.get_installed(installed_paths)
+        current = []
+        for wid, appid in items:
+            metadata = details.get(wid)
+            if wid not in installed_paths or not metadata or metadata.removed or not metadata.time_updated:
+                continue
+            if metadata.file_size:
+                self.item_sizes[wid] = metadata.file_size
+
+            local_time = revisions.get(wid) or os.path.getmtime(installed_paths[wid])
+
+            if local_time >= metadata.time_updated:
+                self.report(f'{wid} is up to date', color='green')
+                current.append(wid)
+
+        skip = set(current)
+        return [(wid, appid) for wid, appid in items if wid not in skip], current
+
+    def take_batches(self, items: list, final: bool = False) -> Tuple[list, list]:
+        """
+        Cut the full batches off the pending mods of one appid
+
+        Parameters
+        ----------
+        items : list
+            The pending (wid, appid) tuples of the appid
+        final : bool
+            Whether or not more mods are coming. The last batch is cut even if it isn't full,
+            and under a size policy the items are ordered or packed first
+
+        Returns
+        -------
+        batches : list
+            The batches, each a list of (wid, appid) tuples
+        items : list
+            The (wid, appid) tuples that didn't fill a batch yet
+        """
+        if final and self.scheduler.policy == BINPACK:
+            batch_size = self.batcher.next_size() if self.batcher else self.batch_size
+            return self.scheduler.pack(items, self.item_sizes, batch_size), []
+        if final:
+            items = self.scheduler.order(items, self.item_sizes)
+
+        batches = []
+        count = self.next_batch_count(items, final=final)
+        while count:
+            batches.append(items[:count])
+            items = items[count:]
+            count = self.next_batch_count(items, final=final)
+        return batches, items
+
+    def next_batch_count(self, pending: list, final: bool = False) -> int:
+        """
+        Get how many of the pending mods go in the next batch
+
+        Parameters
+        ----------
+        pending : list
+            The (wid, appid) tuples waiting to be batched
+        final : bool
+            Whether or not more mods are coming. The last batch is queued even if it isn't full
+
+        Returns
+        -------
+        count : int
+            The size of the next batch, 0 if it isn't full yet
+        """
+        if self.batcher:
+            return self.batcher.take(pending, self.item_sizes, final=final)
+        if len(pending) >= self.batch_size:
+            return self.batch_size
+        return len(pending) if final else 0
 
+    def get_item_sizes(self, wids: list):
+        """
+        Look up the sizes of workshop items so batches can be packed by size. Items
+        the web api doesn't know are batched by the average size
+
+        Parameters
+        ----------
+        wids : list
+            The wids to look up
+        """
+        wids = [wid for wid in wids if wid not in self.item_sizes]
+        if not wids:
+            return
+        try:
+            details = self.metadata_provider.get_details(wids)
+        except Exception as e:
+            self.report(f'Could not get the sizes of {len(wids)} mod(s): {e}', color='red')
+            return
+        for wid, metadata in details.items():
+            if metadata.file_size:
+                self.item_sizes[wid] = metadata.file_size
+
+    def download_batch(self, pool: SteamCMDWorkerPool, batch: list, batch_number: int = 1):
+        """
+        Queue a batch of mods for the next free steamcmd worker
+
+        Parameters
+        ----------
+        pool : SteamCMDWorkerPool
+            The worker pool to queue the batch on
+        batch : list
+            A list of (wid, appid) tuples
+        batch_number : int
+            The number of the batch, used for output
+        """
+        if self.cancelled.is_set():
+            return
+        self.report(f'Batch {batch_number} ({len(batch)} mods) queued', color='yellow')
+        self.stats.add_queued(len(batch))
+        pool.submit(batch)
+
+    def build_args(self, batch: list, install_dir: Optional[str] = None, validate: bool = True) -> list:
+        """
+        Build the steamcmd args to download a batch of mods
+
+        Parameters
+        ----------
+        batch : list
+            A list of (wid, appid) tuples
+        install_dir : str
+            The directory steamcmd installs to, its own directory if None
+        validate : bool
+            Whether or not steamcmd should validate the downloads
+
+        Returns
+        -------
+        args : list
+            The args to run steamcmd with
+        """
+        args = [os.path.join(self.steamcmd_path, 'steamcmd.exe')]
+        # the install dir has to be set before logging in
+        if install_dir:
+            args.extend(['+force_install_dir', install_dir])
+        args.append('+login anonymous') # TODO: Add login
+
+        for wid, appid in batch:
+            args.append(f'+workshop_download_item {appid} {wid}')
+
+        if validate:
             args.append("validate")
-            args.append('+quit')
+        args.append('+quit')
+        return args
 
-            print(args)
-            # do the ui stuff
-            # if self._mod_downloader.ui_running:
-            #     self._mod_downloader.ui.downloader_tab.add_text_to_console(' '.join(args), color='yellow')
+    def _wait_for_pool(self, pool: SteamCMDWorkerPool):
+        """
+        Wait for a worker pool to finish, retry the items that failed and report the results
+
+        Parameters
+        ----------
+        pool : SteamCMDWorkerPool
+            The pool to wait for
+        """
+        scheduler = RetryScheduler(
+            max_attempts=self.retry_attempts,
+            base_delay=self.retry_base_delay,
+            max_delay=self.retry_max_delay,
+            batch_size=self.batcher.next_size() if self.batcher else self.batch_size,
+        )
+        installed = self._collect_results(pool.join(), scheduler)
+
+        # only the failed items are downloaded again, without validating everything else
+        while scheduler.pending and not self.cancelled.is_set():
+            # a cancel during the backoff ends the retries right away
+            if scheduler.wait(self.cancelled):
+                break
+            batches = scheduler.due_batches()
+            if not batches:
+                continue
+
+            retry_pool = SteamCMDWorkerPool(
+                self, min(self.workers, len(batches)), session_mode=self.session_mode,
+                batcher=self.batcher, journal=self.journal, async_mode=self.async_supervisor,
+                queue_size=self.install_queue_size, install_workers=self.install_workers,
+            )
+            retry_pool.start()
+            for batch in batches:
+                self.report(f'Retrying {", ".join(wid for wid, _ in batch)}', color='yellow')
+                self.stats.add_queued(len(batch))
+                retry_pool.submit(batch, validate=False)
+            retry_pool.close()
+            installed += self._collect_results(retry_pool.join(), scheduler)
+
+        self.report(f'{installed} mod(s) downloaded ({self.stats})', color='green')
+        if self.cancelled.is_set():
+            self.report('The download was cancelled, the rest of the mods are resumed next time', color='red')
+        for wid, state in scheduler.final_report().items():
+            self.report(f'{wid} failed to download after {state.attempts} attempt(s): {state.reason}', color='red')
+
+        # the next run starts from this run's measurements
+        if self.batcher and self.batcher.has_estimates:
+            self.report(
+                f'Measured {self.batcher.bytes_per_second / 1024 ** 2:.2f} MB/s and '
+                f'{self.batcher.item_overhead:.1f}s per mod, next batch size {self.batcher.next_size()}',
+                color='yellow',
+            )
+            self.batcher.save(self.config)
+        if self.journal:
+            self.journal.prune()
+        self.finish_download()
+
+    def _collect_results(self, results: List[WorkerResult], scheduler: RetryScheduler) -> int:
+        """
+        Hand the failed items of a pool's results to the retry scheduler
+
+        Parameters
+        ----------
+        results : list
+            The WorkerResults of the pool
+        scheduler : RetryScheduler
+            The scheduler to hand the failures to
+
+        Returns
+        -------
+        installed : int
+            The number of items that were installed
+        """
+        installed = 0
+        for result in results:
+            installed += len(result.installed)
+            # the items a cancel stopped haven't failed, they don't use up an attempt and stay queued
+            failed = {wid: reason for wid, reason in result.failed.items() if reason != CANCELLED}
+            scheduler.add_failures(failed, dict(result.batch))
+
+        # the items that will be retried are still outstanding if the run dies before the retry
+        if self.journal:
+            final = scheduler.final_report()
+            for result in results:
+                self.journal.mark_failed({wid: reason for wid, reason in result.failed.items() if wid in final})
+                self.journal.mark([wid for wid in result.failed if wid not in final], QUEUED)
+        return installed
+
+    def cancel(self):
+        """
+        Cancel the running download. Every steamcmd process tree is killed and no more batches
+        are started, the unfinished mods stay in the journal for the next run
+        """
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        self.report('Cancelling the download...', color='red')
+        self.watchdog.cancel()
+
+    def close(self, timeout: float = 30):
+        """
+        Cancel the running download and close the sqlite stores and the http session. The
+        stores stay open if the download doesn't stop within the timeout, so it can't fail on them
+
+        Parameters
+        ----------
+        timeout : float
+            How long to wait for the running download to stop
+        """
+        if self._download_thread and self._download_thread.is_alive():
+            self.cancel()
+            self._download_thread.join(timeout)
+            if self._download_thread.is_alive():
+                return
+        for store in (self.resolve_cache, self.manifest, self.name_resolver, self.journal):
+            if store:
+                store.close()
+        self.resolver.close()
+
+    def _on_stall(self, watched: WatchedProcess):
+        """
+        Report a steamcmd process the watchdog killed for making no progress
+        """
+        self.report(
+            f'SteamCMD made no progress for {self.stall_timeout:.0f}s, killed it so its mods are retried',
+            color='red',
+        )
+
+    def finish_download(self):
+        """
+        Reset the downloader and the ui once every download is done. Called from a worker
+        thread, so the ui is reset on the qt thread through a signal
+        """
+        if not self._mod_downloader.ui_running:
+            self._mod_downloader.running = False
+            return
+
+        if not self.downloader_tab:
+            self.downloader_tab = self._mod_downloader.ui.downloader_tab
+        self.downloader_tab.download_finished.emit()
 
-            # run steamcmd
-            # self.run_steamcmd(args)
-            self.run_steamcmd_threaded(args)
-    
     def run_steamcmd_threaded(self, args: list):
         """
         Run steamcmd in a thread with the given args
@@ -322,7 +842,7 @@ class SteamCMD:
         progress : int
             The progress to update the bar with
         """
-        self._mod_downloader.ui.downloader_tab.update_progress_bar(progress)
+        self._mod_downloader.ui.downloader_tab.progress_changed.emit(progress)
     
     def error_message(self, message: str):
         """
@@ -351,74 +871,86 @@ class SteamCMD:
         """
         if not self.downloader_tab:
             self.downloader_tab = self._mod_downloader.ui.downloader_tab
-        self.downloader_tab.add_text_to_console(text, newline=newline, color=color)
+        self.downloader_tab.text_added.emit(text, newline, color)
+
+    def report(self, text: str, color: str='white'):
+        """
+        Print text and add it to the console if the ui is running
+
+        Parameters
+        ----------
+        text : str
+            The text to report
+        color : str
+            The color of the text in the console
+        """
+        print(text)
+        if self._mod_downloader.ui_running:
+            self.add_text_to_console(text, color=color)
 
-    def run_steamcmd(self, args: list):
+    def handle_event(self, event: SteamCMDEvent):
         """
-        Run steamcmd with the given args
+        Show a steamcmd event in the console and count it towards the progress
+
+        Parameters
+        ----------
+        event : SteamCMDEvent
+            The event parsed from the steamcmd output
+        """
+        self.stats.add_event(event)
+
+        if isinstance(event, ItemDownloaded):
+            self.report(f'Downloaded {event.wid} ({event.size} bytes)', color='green')
+        elif isinstance(event, ItemFailed):
+            self.report(f'Download of {event.wid} failed ({event.reason})', color='red')
+        elif isinstance(event, LoginOk):
+            self.report(event.line, color='green')
+        elif isinstance(event, (ProcessExit, BatchEnd)):
+            # the items report their own results, only a failed exit is worth showing
+            if event.return_code:
+                self.report(f'SteamCMD exited with return code {event.return_code}', color='red')
+        else:
+            self.report(event.line)
+
+        if isinstance(event, (ItemDownloaded, ItemFailed)) and self._mod_downloader.ui_running:
+            self.update_progress_bar(self.stats.progress)
+
+    def run_steamcmd(self, args: list, install_dir: Optional[str] = None) -> BatchResult:
+        """
+        Run steamcmd with the given args and wait for it to exit, or for the watchdog
+        to kill it when it stops making progress
 
         Parameters
         ----------
         args : list
             The args to run steamcmd with
+        install_dir : str
+            The +force_install_dir in the args, if any. Its downloads dir is watched for progress
 
         Returns
         -------
-        success : bool
-            Whether or not the download was successful
+        result : BatchResult
+            The return code and the downloaded and failed items
         """
         if self.steamcmd_installed:
-            # os.system(' '.join(args))
+            proc = subprocess.Popen(
+                args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, errors='ignore', **popen_kwargs()
+            )
+            watched = self.watchdog.watch(proc, get_workshop_downloads_path(install_dir or self.steamcmd_path))
 
-            proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, errors='ignore')
-            # stdout, stderr = proc.communicate()
-            
-            while True:
-                out = proc.stdout.readline()
-                
-                if out == b'' and proc.poll() is not None:
-                    break
-                
-                if out:
-                    if m := re.search("Redirecting stderr to", out):
-                        print(m)
-                        if self._mod_downloader.ui_running:
-                            self.add_text_to_console(f'{out[: m.span()[0]]} \n', color='red')
-                            break
-                        
-                    if re.match("-- type 'quit' to exit --", out):
-                        continue
-                    
-                    return_code = proc.poll()
-                    print(f'return code: {return_code}')
-                    if return_code is not None:
-                        for out in proc.stdout.readlines():
-                            self.add_text_to_console(out.decode('utf-8'), color='green')
-                            print(out.decode('utf-8'))
-                            break
-                        
-            # self.downloader_tab.update_progress_bar(100)
-            self.downloader_tab.progress_bar.setVisible(False)
-            self.downloader_tab.spinner_button.setVisible(False)
-            self.downloader_tab.download_button.setEnabled(True)
-            self.downloader_tab.download_button.setVisible(True)
-
-            # if stdout:
-            #     print(stdout.decode('utf-8'))
-            #     line = stdout.decode('utf-8')
-                
-            #     if yeet := re.search("Redirecting stderr to", line):
-            #         # how can I stop the process or return an error or something here?
-            #         print(yeet)
-                
-            #     if self._mod_downloader.ui_running:
-            #         self._mod_downloader.ui.downloader_tab.add_text_to_console(stdout.decode('utf-8'), color='green')
-            # if stderr:
-            #     print(stderr.decode('utf-8'))
-            #     if self._mod_downloader.ui_running:
-            #         self._mod_downloader.ui.downloader_tab.add_text_to_console(stderr.decode('utf-8'), color='red')
-
-            # return True
+            result = BatchResult()
+            try:
+                for event in self.parser.iter_events(proc.stdout):
+                    self.watchdog.activity(watched)
+                    result.add_event(event)
+                    self.handle_event(event)
+            finally:
+                self.watchdog.unwatch(watched)
+
+            exit_event = ProcessExit(proc.wait())
+            result.add_event(exit_event)
+            self.handle_event(exit_event)
+            return result
 
         else:
-            raise SteamCMDNotInstalledException('SteamCMD is not installed')
\ No newline at end of file
+            raise SteamCMDNotInstalledException('SteamCMD is not installed')
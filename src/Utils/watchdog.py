@@ -0,0 +1,222 @@
+from dataclasses import dataclass, field
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Callable, List, Optional, Union
+import os
+import signal
+import subprocess
+import sys
+import time
+
+if TYPE_CHECKING:
+    import asyncio
+
+
+def popen_kwargs() -> dict:
+    """
+    The Popen kwargs that start a process in its own process group, so its whole tree can be killed
+    """
+    if sys.platform == 'win32':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+
+def get_return_code(proc: Union[subprocess.Popen, 'asyncio.subprocess.Process']) -> Optional[int]:
+    """
+    Get the return code of a Popen or asyncio process, None while it is running
+    """
+    if isinstance(proc, subprocess.Popen):
+        return proc.poll()
+    return proc.returncode
+
+
+def kill_process_tree(proc: Union[subprocess.Popen, 'asyncio.subprocess.Process']):
+    """
+    Kill a process started with popen_kwargs and every process it started
+
+    Parameters
+    ----------
+    proc : subprocess.Popen or asyncio.subprocess.Process
+        The process to kill
+    """
+    if get_return_code(proc) is not None:
+        return
+    try:
+        if sys.platform == 'win32':
+            subprocess.run(
+                ['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    # taskkill can miss a process that is just exiting
+    if get_return_code(proc) is None:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+
+def get_dir_size(path: str) -> int:
+    """
+    Get the total size of the files under a directory, 0 if it doesn't exist
+    """
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+
+@dataclass(eq=False)
+class WatchedProcess:
+    """
+    A process the watchdog keeps an eye on
+    """
+    proc: Union[subprocess.Popen, 'asyncio.subprocess.Process']
+    watch_dir: Optional[str] = None
+    loop: Optional['asyncio.AbstractEventLoop'] = None
+    last_activity: float = field(default_factory=time.monotonic)
+    last_size: int = 0
+    stalled: bool = False
+
+
+class ProcessWatchdog:
+    """
+    Kills steamcmd processes that stop making progress, and every process on cancel.
+    A process makes progress while it writes output or the size of its download dir changes
+    """
+    def __init__(
+        self,
+        stall_timeout: float = 300,
+        poll_interval: Optional[float] = None,
+        on_stall: Optional[Callable[[WatchedProcess], None]] = None,
+    ):
+        """
+        ProcessWatchdog class init
+
+        Parameters
+        ----------
+        stall_timeout : float
+            The seconds a process can go without progress before it is killed, 0 to never kill it
+        poll_interval : float
+            The seconds between checks, a quarter of the stall timeout up to 5 seconds if None
+        on_stall : callable
+            Called with the WatchedProcess after a stalled process was killed
+        """
+        self.stall_timeout: float = stall_timeout
+        self.poll_interval: float = poll_interval or min(5.0, max(0.1, stall_timeout / 4))
+        self.on_stall = on_stall
+
+        self._lock = Lock()
+        self._watched: List[WatchedProcess] = []
+        self._thread: Optional[Thread] = None
+
+    def watch(
+        self,
+        proc: Union[subprocess.Popen, 'asyncio.subprocess.Process'],
+        watch_dir: Optional[str] = None,
+        loop: Optional['asyncio.AbstractEventLoop'] = None,
+    ) -> WatchedProcess:
+        """
+        Start watching a process
+
+        Parameters
+        ----------
+        proc : subprocess.Popen or asyncio.subprocess.Process
+            The process, started with popen_kwargs
+        watch_dir : str
+            The dir whose size counts as progress, if any
+        loop : asyncio.AbstractEventLoop
+            The event loop an asyncio process runs on, it is killed on that loop's thread
+
+        Returns
+        -------
+        watched : WatchedProcess
+            The handle to report activity on and to unwatch the process with
+        """
+        watched = WatchedProcess(proc, watch_dir, loop, last_size=get_dir_size(watch_dir) if watch_dir else 0)
+        with self._lock:
+            self._watched.append(watched)
+            if self.stall_timeout > 0 and (self._thread is None or not self._thread.is_alive()):
+                self._thread = Thread(target=self._monitor, daemon=True)
+                self._thread.start()
+        return watched
+
+    @staticmethod
+    def activity(watched: WatchedProcess):
+        """
+        Record that a process wrote output
+        """
+        watched.last_activity = time.monotonic()
+
+    def unwatch(self, watched: WatchedProcess):
+        """
+        Stop watching a process
+        """
+        with self._lock:
+            if watched in self._watched:
+                self._watched.remove(watched)
+
+    def cancel(self):
+        """
+        Kill every watched process tree
+        """
+        with self._lock:
+            watched = list(self._watched)
+        for w in watched:
+            self._kill(w)
+
+    @staticmethod
+    def _kill(watched: WatchedProcess):
+        """
+        Kill a watched process tree. An asyncio process isn't thread safe, it is killed on its loop
+        """
+        if watched.loop is None:
+            kill_process_tree(watched.proc)
+            return
+        try:
+            watched.loop.call_soon_threadsafe(kill_process_tree, watched.proc)
+        except RuntimeError:
+            # the loop is closed, so its processes are gone
+            pass
+
+    def _monitor(self):
+        """
+        Check the watched processes until there are none left
+        """
+        while True:
+            time.sleep(self.poll_interval)
+            with self._lock:
+                watched = list(self._watched)
+                if not watched:
+                    self._thread = None
+                    return
+
+            now = time.monotonic()
+            for w in watched:
+                if get_return_code(w.proc) is not None or w.stalled:
+                    continue
+                if w.watch_dir:
+                    size = get_dir_size(w.watch_dir)
+                    if size != w.last_size:
+                        w.last_size = size
+                        w.last_activity = now
+                if now - w.last_activity > self.stall_timeout:
+                    w.stalled = True
+                    self._kill(w)
+                    if self.on_stall:
+                        self.on_stall(w)
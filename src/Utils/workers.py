@@ -0,0 +1,553 @@
+from dataclasses import dataclass, field
+from queue import Queue
+from threading import Condition, Lock, Thread
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+import os
+import shutil
+import time
+
+from .acf import WORKERS_DIR, get_sandbox_dirs, get_steamcmd_dir, get_workshop_content_path, read_installed_items
+from .batching import AdaptiveBatcher
+from .events import CANCELLED, BatchResult, ProcessExit, SteamCMDEvent
+from .journal import DONE, IN_PROGRESS, DownloadJournal
+from .session import SteamCMDSession
+from .supervisor import SteamCMDSupervisor
+
+if TYPE_CHECKING:
+    from .utils import SteamCMD
+
+# put on the dispatcher's queue when a sandbox is free again, or a batch is submitted
+RELEASED = 'released'
+SUBMITTED = 'submitted'
+
+
+@dataclass
+class WorkerResult:
+    """
+    The outcome of one batch run by a worker
+    """
+    worker: int
+    batch: List[Tuple[str, str]]
+    return_code: Optional[int] = None
+    installed: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    bytes: int = 0
+    duration: float = 0.0
+    sandbox: Optional[int] = None
+
+
+class SteamCMDWorkerPool:
+    """
+    Runs several steamcmd processes at once. Each worker downloads into its own
+    +force_install_dir sandbox so the processes don't fight over one steamapps
+    directory.
+
+    A finished batch goes through a verify stage and an install stage that move it into
+    the game's mod folder, so the disk work of one batch overlaps the download of the next.
+    A sandbox stays leased to its batch until the batch is installed, so steamcmd never
+    writes to a sandbox that is still being installed from. There are queue_size sandboxes
+    more than workers: when installing falls behind, the workers run out of sandboxes and
+    wait before downloading more instead of filling the disk
+    """
+    def __init__(
+        self,
+        steamcmd: 'SteamCMD',
+        workers: int = 1,
+        session_mode: bool = False,
+        batcher: Optional[AdaptiveBatcher] = None,
+        journal: Optional[DownloadJournal] = None,
+        async_mode: bool = False,
+        queue_size: int = 2,
+        install_workers: int = 1,
+    ):
+        """
+        SteamCMDWorkerPool class init
+
+        Parameters
+        ----------
+        steamcmd : SteamCMD
+            The steamcmd object that builds the args and runs the processes
+        workers : int
+            The number of steamcmd processes to run at once
+        session_mode : bool
+            Keep one steamcmd session alive per worker instead of starting a process per batch
+        batcher : AdaptiveBatcher
+            The batcher that is told how long every batch took, if any
+        journal : DownloadJournal
+            The journal the progress of every item is recorded in, if any
+        async_mode : bool
+            Run the processes on one asyncio supervisor thread instead of a thread per worker.
+            Session mode drives steamcmd over stdin and always uses a thread per worker
+        queue_size : int
+            The number of downloaded batches that can wait to be installed while every worker downloads.
+            A session is tied to its sandbox, so in session mode a worker waits for its own batch instead
+        install_workers : int
+            The number of batches installed at once
+        """
+        self.steamcmd = steamcmd
+        self.workers: int = max(1, workers)
+        self.session_mode: bool = session_mode
+        self.batcher: Optional[AdaptiveBatcher] = batcher
+        self.journal: Optional[DownloadJournal] = journal
+        self.async_mode: bool = async_mode and not session_mode
+
+        # the resolve thread blocks on submit while every worker has a batch waiting, so the
+        # resolved mods don't pile up ahead of the downloads
+        self._batches: Queue = Queue(maxsize=self.workers)
+        # the supervisor's events for the dispatcher in async mode, the loop can't wait on a full queue
+        self._queue: Queue = Queue()
+        self._threads: List[Thread] = []
+        self.install_workers: int = max(1, install_workers)
+        # the sandboxes bound the batches between the stages, so these queues never fill up
+        self._verify_queue: Queue = Queue()
+        self._install_queue: Queue = Queue()
+        self._stage_threads: List[Thread] = []
+        self.sandbox_count: int = self.workers if session_mode else self.workers + max(0, queue_size)
+        self._free_sandboxes: List[int] = list(range(self.sandbox_count))
+        self._sandbox_condition = Condition()
+        self._results: List[WorkerResult] = []
+        self._results_lock = Lock()
+
+    @staticmethod
+    def get_sandbox_path(steamcmd_path: str, sandbox: int) -> str:
+        """
+        Get the install dir of a sandbox
+        """
+        return os.path.join(get_steamcmd_dir(steamcmd_path), WORKERS_DIR, f'worker_{sandbox}')
+
+    def _lease_sandbox(self, worker: Optional[int] = None, block: bool = True) -> Optional[int]:
+        """
+        Take a free sandbox for a batch
+
+        Parameters
+        ----------
+        worker : int
+            The session worker whose own sandbox is taken, any sandbox if None
+        block : bool
+            Wait until a sandbox is free instead of returning None
+
+        Returns
+        -------
+        sandbox : int
+            The sandbox, None if none is free and block is False
+        """
+        with self._sandbox_condition:
+            while True:
+                if worker is not None:
+                    sandbox = worker if worker in self._free_sandboxes else None
+                else:
+                    sandbox = self._free_sandboxes[0] if self._free_sandboxes else None
+                if sandbox is not None:
+                    self._free_sandboxes.remove(sandbox)
+                    return sandbox
+                if not block:
+                    return None
+                self._sandbox_condition.wait()
+
+    def _release_sandbox(self, sandbox: int):
+        """
+        Give a sandbox back once its batch is installed
+        """
+        with self._sandbox_condition:
+            self._free_sandboxes.append(sandbox)
+            self._sandbox_condition.notify_all()
+        # wake the dispatcher, it may have batches waiting for a sandbox
+        if self.async_mode:
+            self._queue.put(RELEASED)
+
+    def start(self):
+        """
+        Start the verify and install stages, and the worker threads or the dispatcher thread in async mode
+        """
+        self._stage_threads.append(Thread(target=self._verify_stage, daemon=True))
+        for _ in range(self.install_workers):
+            self._stage_threads.append(Thread(target=self._install_stage, daemon=True))
+        for t in self._stage_threads:
+            t.start()
+
+        if self.async_mode:
+            t = Thread(target=self._dispatch, daemon=True)
+            t.start()
+            self._threads.append(t)
+            return
+
+        for i in range(self.workers):
+            t = Thread(target=self._work, args=(i,), daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, batch: List[Tuple[str, str]], validate: bool = True):
+        """
+        Queue a batch of (wid, appid) tuples for the next free worker
+
+        Parameters
+        ----------
+        batch : list
+            A list of (wid, appid) tuples
+        validate : bool
+            Whether or not steamcmd should validate the downloads
+        """
+        self._batches.put((list(batch), validate))
+        if self.async_mode:
+            self._queue.put(SUBMITTED)
+
+    def close(self):
+        """
+        Tell the workers that no more batches are coming
+        """
+        if self.async_mode:
+            self._queue.put(None)
+            return
+        for _ in self._threads:
+            self._batches.put(None)
+
+    def join(self) -> List[WorkerResult]:
+        """
+        Wait for every worker to finish and every downloaded batch to be installed
+
+        Returns
+        -------
+        results : list
+            The WorkerResult of every batch
+        """
+        for t in self._threads:
+            t.join()
+        # the verify stage passes the end on to the install stage
+        self._verify_queue.put(None)
+        for t in self._stage_threads:
+            t.join()
+        return self._results
+
+    def _work(self, worker: int):
+        """
+        Take batches off the queue until the pool is closed
+        """
+        session = None
+        if self.session_mode:
+            session_dir = self.get_sandbox_path(self.steamcmd.steamcmd_path, worker)
+            os.makedirs(session_dir, exist_ok=True)
+            session = SteamCMDSession(self.steamcmd, install_dir=session_dir)
+
+        try:
+            while True:
+                work = self._batches.get()
+                if work is None:
+                    break
+                batch, validate = work
+
+                # wait until a sandbox is installed from and free again
+                lease = self._lease_sandbox(worker if self.session_mode else None)
+                sandbox = self.get_sandbox_path(self.steamcmd.steamcmd_path, lease)
+                os.makedirs(sandbox, exist_ok=True)
+                result = self._start_batch(worker, batch, lease)
+                if result is None:
+                    continue
+                started = time.monotonic()
+                try:
+                    if session:
+                        batch_result = session.download_batch(batch, validate=validate)
+                    else:
+                        batch_result = self.steamcmd.run_steamcmd(
+                            self.steamcmd.build_args(batch, install_dir=sandbox, validate=validate),
+                            install_dir=sandbox,
+                        )
+                except Exception as e:
+                    self._fail_batch(result, e)
+                    continue
+                self._finish_batch(sandbox, result, batch_result, started)
+        finally:
+            if session:
+                session.close()
+
+    def _dispatch(self):
+        """
+        Run the batches on one asyncio supervisor, with up to one steamcmd process per worker
+        sandbox at a time. The supervisor's events come in on the queue that wakes the dispatcher
+        for new batches and free sandboxes
+        """
+        supervisor = SteamCMDSupervisor(self.steamcmd, events=self._queue)
+        supervisor.start()
+        # the running batches keyed by their sandbox
+        running: Dict[int, Tuple[WorkerResult, BatchResult, float]] = {}
+        closing = False
+
+        try:
+            while not closing or running or not self._batches.empty():
+                work = self._queue.get()
+                if work is None:
+                    closing = True
+                elif work is RELEASED or work is SUBMITTED:
+                    pass
+                elif isinstance(work[1], SteamCMDEvent):
+                    lease, event = work
+                    self.steamcmd.handle_event(event)
+                    result, batch_result, started = running[lease]
+                    batch_result.add_event(event)
+                    if isinstance(event, ProcessExit):
+                        del running[lease]
+                        sandbox = self.get_sandbox_path(self.steamcmd.steamcmd_path, lease)
+                        self._finish_batch(sandbox, result, batch_result, started)
+
+                # start the waiting batches while a worker slot and a sandbox are free,
+                # the sandbox comes back once the install stage is done with it
+                while not self._batches.empty() and len(running) < self.workers:
+                    lease = self._lease_sandbox(block=False)
+                    if lease is None:
+                        break
+                    batch, validate = self._batches.get()
+                    result = self._start_batch(lease, batch, lease)
+                    if result is None:
+                        continue
+                    sandbox = self.get_sandbox_path(self.steamcmd.steamcmd_path, lease)
+                    os.makedirs(sandbox, exist_ok=True)
+                    running[lease] = (result, BatchResult(), time.monotonic())
+                    supervisor.run(
+                        self.steamcmd.build_args(batch, install_dir=sandbox, validate=validate),
+                        install_dir=sandbox,
+                        tag=lease,
+                    )
+        finally:
+            supervisor.close()
+
+    def _start_batch(self, worker: int, batch: List[Tuple[str, str]], sandbox: int) -> Optional[WorkerResult]:
+        """
+        Record that a worker starts a batch in a leased sandbox
+
+        Returns
+        -------
+        result : WorkerResult
+            The result to fill in, None if the run was cancelled and the batch is dropped
+        """
+        result = WorkerResult(worker, batch, sandbox=sandbox)
+        if self.journal:
+            self.journal.mark([wid for wid, _ in batch], IN_PROGRESS)
+        # a cancelled run drops the batches that haven't started
+        if self.steamcmd.cancelled.is_set():
+            result.failed = {wid: CANCELLED for wid, _ in batch}
+            self._record(result)
+            return None
+        return result
+
+    def _finish_batch(self, sandbox: str, result: WorkerResult, batch_result: BatchResult, started: float):
+        """
+        Measure a finished batch and hand it to the verify stage
+        """
+        result.duration = time.monotonic() - started
+        result.bytes = sum(batch_result.downloaded.values())
+        result.return_code = batch_result.return_code
+        if self.batcher and batch_result.downloaded:
+            self.batcher.record(len(batch_result.downloaded), result.bytes, result.duration)
+        self._verify_queue.put((sandbox, result, batch_result))
+
+    def _verify_stage(self):
+        """
+        Verify the downloaded batches and queue their items for the install stage
+        """
+        while True:
+            work = self._verify_queue.get()
+            if work is None:
+                break
+            sandbox, result, batch_result = work
+            try:
+                items = self.verify(sandbox, result, batch_result)
+            except Exception as e:
+                self._fail_batch(result, e)
+                continue
+            self._install_queue.put((result, items))
+
+        for _ in range(self.install_workers):
+            self._install_queue.put(None)
+
+    def _install_stage(self):
+        """
+        Install the verified batches into the mod folders
+        """
+        while True:
+            work = self._install_queue.get()
+            if work is None:
+                break
+            result, items = work
+            sandbox = self.get_sandbox_path(self.steamcmd.steamcmd_path, result.sandbox)
+            try:
+                names = self.get_names(items)
+                for wid, appid, content_path in items:
+                    item = read_installed_items(sandbox, appid).get(wid)
+                    self.install(content_path, wid, appid, names.get(wid), item.time_updated if item else None)
+                    result.installed.append(wid)
+            except Exception as e:
+                self._fail_batch(result, e)
+                continue
+            self._record(result)
+
+    def _fail_batch(self, result: WorkerResult, error: Exception):
+        """
+        Fail the items of a batch that weren't installed when something went wrong
+        """
+        self.steamcmd.report(f'Worker {result.worker} failed: {error}', color='red')
+        for wid, _ in result.batch:
+            if wid not in result.installed:
+                result.failed.setdefault(wid, str(error))
+        self._record(result)
+
+    def _record(self, result: WorkerResult):
+        if self.journal:
+            self.journal.mark(result.installed, DONE)
+        with self._results_lock:
+            self._results.append(result)
+        # the batch is done with its sandbox
+        if result.sandbox is not None:
+            self._release_sandbox(result.sandbox)
+
+    @staticmethod
+    def verify(sandbox: str, result: WorkerResult, batch_result: BatchResult) -> List[Tuple[str, str, str]]:
+        """
+        Check which items of a batch a worker downloaded into its sandbox. An item is downloaded
+        when steamcmd didn't report it failed and its content dir has files in it
+
+        Parameters
+        ----------
+        sandbox : str
+            The install dir of the worker
+        result : WorkerResult
+            The result of the batch, updated with the failed wids
+        batch_result : BatchResult
+            The per item results steamcmd reported for the batch
+
+        Returns
+        -------
+        items : list
+            The (wid, appid, content path) tuples to install
+        """
+        items = []
+        for wid, appid in result.batch:
+            if wid in batch_result.failed:
+                result.failed[wid] = batch_result.failed[wid]
+                continue
+            content_path = get_workshop_content_path(sandbox, appid, wid)
+            if not os.path.isdir(content_path):
+                result.failed[wid] = 'Not downloaded'
+                continue
+            if not os.listdir(content_path):
+                result.failed[wid] = 'Download is empty'
+                continue
+            items.append((wid, appid, content_path))
+        return items
+
+    def get_names(self, items: List[Tuple[str, str, str]]) -> Dict[str, str]:
+        """
+        Get the names the items are installed under in rename mode, nothing when it is off
+
+        Parameters
+        ----------
+        items : list
+            The (wid, appid, content path) tuples to install
+        """
+        if not self.steamcmd.rename_mode:
+            return {}
+        return self.steamcmd.name_resolver.resolve(items)
+
+    def install(
+        self,
+        content_path: str,
+        wid: str,
+        appid: str,
+        name: Optional[str] = None,
+        revision: Optional[float] = None,
+    ):
+        """
+        Install a downloaded item into the mod folder of its game, moved or in copy mode copied.
+        Without a game for its appid the item stays where it is
+
+        Parameters
+        ----------
+        content_path : str
+            The workshop content dir of the item
+        wid : str
+            The wid of the item
+        appid : str
+            The appid of the item
+        name : str
+            The name of the item in rename mode, it is installed in a folder named after its wid without one
+        revision : float
+            The steam time_updated of the downloaded revision, recorded in the manifest once it is installed
+        """
+        mod_folder_path = self.steamcmd.get_mod_folder_path(appid)
+        if not mod_folder_path:
+            if self.steamcmd.mod_folder_path:
+                self.steamcmd.report(
+                    f'No game in the config has appid {appid}, {wid} stays in {content_path}', color='yellow'
+                )
+            return
+
+        folders = [(content_path, wid)]
+        if self.steamcmd.rename_mode:
+            folders = self.steamcmd.name_resolver.get_install_folders(
+                content_path, wid, appid, name, mod_folder_path
+            )
+        for source, folder in folders:
+            new_path = os.path.join(mod_folder_path, folder)
+            result = self.steamcmd.installer.install(source, new_path)
+            self.steamcmd.report(f'{wid} installed to {new_path} ({result})', color='green')
+
+        if revision:
+            self.steamcmd.manifest.set_installed({wid: revision})
+
+        # the rest of an item whose mods were moved out of it
+        if not self.steamcmd.installer.copy_mode and os.path.isdir(content_path):
+            shutil.rmtree(content_path, ignore_errors=True)
+
+    def recover(self, items: List[Tuple[str, str]]) -> List[str]:
+        """
+        Install the items an earlier run finished downloading into a sandbox but never installed.
+        steamcmd only lists an item in the sandbox's appworkshop acf once its download is complete,
+        and only the revision steam has now is installed, a sandbox in copy mode keeps older ones
+
+        Parameters
+        ----------
+        items : list
+            The (wid, appid) tuples to look for
+
+        Returns
+        -------
+        recovered : list
+            The wids that were installed from a sandbox. The rest, and the items that
+            failed to install, are left to be downloaded again
+        """
+        # the same sandboxes the preflight reads the acfs of
+        found = {}
+        revisions = {}
+        for sandbox in get_sandbox_dirs(self.steamcmd.steamcmd_path):
+            for wid, appid in items:
+                content_path = get_workshop_content_path(sandbox, appid, wid)
+                item = read_installed_items(sandbox, appid).get(wid)
+                # the newest download of an item wins
+                if item and os.path.exists(content_path) and (item.time_updated or 0) > revisions.get(wid, -1):
+                    found[wid] = (wid, appid, content_path)
+                    revisions[wid] = item.time_updated or 0
+        if not found:
+            return []
+
+        try:
+            details = self.steamcmd.metadata_provider.get_details(list(found))
+        except Exception as e:
+            self.steamcmd.report(f'Could not check the downloaded mods against steam: {e}', color='red')
+            return []
+        for wid in list(found):
+            metadata = details.get(wid)
+            if not metadata or metadata.removed or not metadata.time_updated or revisions[wid] < metadata.time_updated:
+                del found[wid]
+
+        names = self.get_names(list(found.values()))
+        recovered = []
+        for wid, appid, content_path in found.values():
+            # a mod that can't be installed, say its folder is locked, doesn't stop the run
+            try:
+                self.install(content_path, wid, appid, names.get(wid), revisions[wid])
+            except Exception as e:
+                self.steamcmd.report(f'{wid} could not be installed, downloading it again: {e}', color='red')
+                continue
+            recovered.append(wid)
+
+        if self.journal:
+            self.journal.mark(recovered, DONE)
+        return recovered
@@ -1,3 +1,3 @@
 
-from .updater import ModUpdater
+from .updater import ModUpdater, LibraryUpdateChecker, UpdateReport
 from .downloader import ModDownloader
\ No newline at end of file
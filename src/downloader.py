@@ -111,7 +111,8 @@ class ModDownloader:
         """
         Set the running value
         """
-        self.ui.downloader_tab.download_button.setEnabled(value)
+        if self.ui_running:
+            self.ui.downloader_tab.download_button.setEnabled(not value)
         self._running = value
 
     @property
@@ -188,3 +189,17 @@ class ModDownloader:
             return
         self.running = True
         self.steamcmd.download_mods_list(mod_list)
+
+    def cancel(self):
+        """
+        Cancel the running download, killing the steamcmd processes
+        """
+        if not self.running:
+            return
+        self.steamcmd.cancel()
+
+    def close(self):
+        """
+        Stop the running download and close the steamcmd stores
+        """
+        self.steamcmd.close()
@@ -1,15 +1,16 @@
-from dataclasses import dataclass
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from termcolor import cprint
 import typing
+import time
 import os
-from datetime import datetime
 
-from .Utils import RemovedFromSteamException
+from .Utils import RemovedFromSteamException, WorkshopMetadata, ManifestEntry, get_metadata_provider
+from .Utils.metadata import steam_time_to_epoch
+from .Utils.acf import read_all_installed_items
 
 if typing.TYPE_CHECKING:
-    from .Utils import Config
+    from .Utils import Config, MetadataProvider, ManifestIndex, ModNameResolver
 
 @dataclass
 class Mod:
@@ -30,32 +31,166 @@ class Mod:
 class ModUpdater:
     """
         This class is responsible for checking for mod updates as well as updating the mod.
+        Nothing is fetched or read until a property needs it or refresh is called, so
+        building many of these is cheap and their lookups can be batched with refresh_many.
     """
-    def __init__(self, config_master: 'Config', mod_wid):
+    def __init__(
+        self,
+        config_master: 'Config',
+        mod_wid,
+        provider: typing.Optional['MetadataProvider'] = None,
+        game: typing.Optional[str] = None,
+        install_path: typing.Optional[str] = None,
+    ):
         self.config = config_master
-        self.wid = mod_wid
+        self.wid = str(mod_wid)
+        # the folder the mod is installed in, its wid folder in the game's mod folder if not given
+        self.install_path = install_path
         self.url = f'https://steamcommunity.com/sharedfiles/filedetails/?id={self.wid}'
-        self.needs_update = False
-        self.removed_from_steam = False
+        self._provider = provider
+        # the game section in the config, found from the metadata if it isn't given
+        self._game = game
 
-        self.steam_created_time_str = None
-        self.steam_created_time_epoch = None
-        self.steam_updated_time_str = None
-        self.steam_updated_time_epoch = None
-        
-        self.local_modified_time_epoch = None
+        self._metadata: typing.Optional[WorkshopMetadata] = None
+        self._local_modified_time_epoch = None
+        self._local_loaded = False
+        # the installed revision from steamcmd's appworkshop acf, if steamcmd knows the item
+        self.installed_item = None
+
+    def __str__(self):
+        return f"{self.mod_name} - {self.wid}"
+
+    # -------------------------------- Properties -------------------------------- #
+    @property
+    def provider(self) -> 'MetadataProvider':
+        if self._provider is None:
+            self._provider = get_metadata_provider(self.config)
+        return self._provider
+
+    @property
+    def metadata(self) -> WorkshopMetadata:
+        if self._metadata is None:
+            self.get_mod_page()
+        return self._metadata
+
+    @property
+    def mod_name(self):
+        return self.metadata.title
+
+    @property
+    def appid(self):
+        return self.metadata.appid
+
+    @property
+    def file_size(self):
+        return self.metadata.file_size
+
+    @property
+    def game_name(self):
+        if self._game is None:
+            # the game section in the config is found by appid, the scraped game name is the fallback
+            self._game = self.config.get_game_from_appid(self.appid) if self.appid else None
+            if self._game is None:
+                return self.metadata.game_name
+        return self._game
+
+    @property
+    def removed_from_steam(self) -> bool:
+        return self.metadata.removed
+
+    @property
+    def steam_created_time_epoch(self):
+        return self.metadata.time_created
+
+    @property
+    def steam_updated_time_epoch(self):
+        # if the mod has never been updated, the updated time is None
+        return self.metadata.time_updated
+
+    @property
+    def local_modified_time_epoch(self):
+        if not self._local_loaded:
+            self.get_local_modified_time()
+        return self._local_modified_time_epoch
 
+    @property
+    def needs_update(self) -> bool:
+        return self.check_for_update()
+
+    # ---------------------------------- Loading --------------------------------- #
+    def refresh(self):
+        """
+        This method is responsible for (re)loading the mod info from steam and the local mod folder.
+
+        Args:
+            None
+
+        Returns:
+            ModUpdater: this updater
+        """
         self.get_mod_page()
         self.get_local_modified_time()
-        
-        self.needs_update = self.check_for_update()
+        return self
+
+    @classmethod
+    def refresh_many(cls, updaters: typing.List['ModUpdater'], executor: typing.Optional[ThreadPoolExecutor] = None):
+        """
+        This method is responsible for refreshing many updaters with batched, concurrent lookups.
+        The updaters are grouped by provider and each provider gets as many wids per call as it takes.
+
+        Args:
+            updaters (list): the updaters to refresh
+            executor (ThreadPoolExecutor): the executor to run the lookups on, one is made if not given
+
+        Returns:
+            dict: the errors keyed by wid
+        """
+        by_provider = {}
+        for updater in updaters:
+            by_provider.setdefault(id(updater.provider), []).append(updater)
+
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(max_workers=8)
+
+        errors = {}
+        try:
+            futures = {}
+            for group in by_provider.values():
+                provider = group[0].provider
+                # the api provider takes many wids per request, the scraper only one
+                chunk_size = getattr(provider, 'batch_size', 1)
+                for i in range(0, len(group), chunk_size):
+                    chunk = group[i:i + chunk_size]
+                    futures[executor.submit(provider.get_details, [u.wid for u in chunk])] = chunk
+
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    details = future.result()
+                except Exception as e:
+                    for updater in chunk:
+                        errors[updater.wid] = str(e)
+                    continue
+
+                for updater in chunk:
+                    if updater.wid not in details:
+                        errors[updater.wid] = 'No metadata returned'
+                        continue
+                    updater.apply_metadata(details[updater.wid])
+                    try:
+                        updater.get_local_modified_time()
+                    except FileNotFoundError as e:
+                        errors[updater.wid] = str(e)
+        finally:
+            if own_executor:
+                executor.shutdown()
+
+        return errors
 
-    def __str__(self):
-        return f"{self.mod_name} - {self.wid}"
-    
     def get_mod_page(self):
         """
-        This method is responsible for getting the mod info from steam.
+        This method is responsible for getting the mod info from steam through the metadata provider.
 
         Args:
             None
@@ -63,71 +198,61 @@ class ModUpdater:
         Returns:
             None
         """
-        # get the mod info
-        self.get = requests.get(self.url)
-        self.content = self.get.text
-
-        # make the soup
-        soup = BeautifulSoup(self.content, 'html.parser')
+        metadata = self.provider.get_details([self.wid]).get(self.wid)
+        if metadata is None:
+            metadata = WorkshopMetadata(self.wid, removed=True)
+        self.apply_metadata(metadata)
 
-        # the mod info we're after is in the div with class 'detailsStatRight'
-        self.mod_name = soup.title.get_text().split("::")[1].strip()
+    def apply_metadata(self, metadata: 'WorkshopMetadata'):
+        """
+        This method is responsible for storing the mod info from a metadata provider.
 
-        self.appid = soup.find_all('a', class_='apphub_sectionTab')[0]['href'].split('/')[-1]
-        self.game_name = soup.find_all('div', class_='apphub_AppName ellipsis')[0].get_text().strip()
+        Args:
+            metadata (WorkshopMetadata): the metadata of the mod
 
-        self.mod_info = soup.find_all('div', class_='detailsStatRight')
-        # if there's nothing in the mod_info list, the mod has been removed from steam
-        if len(self.mod_info) == 0:
-            self.removed_from_steam = True
-            print(f"{self.mod_name} has been removed from Steam")
-            return
+        Returns:
+            None
+        """
+        self._metadata = metadata
+        if metadata.removed:
+            print(f"{metadata.title or self.wid} has been removed from Steam")
             # TODO: Raise exception or not? I kinda plan to use this in a for loop, so it might be better to just return
             # raise RemovedFromSteamException(self.name)
-        # if there's only two items in the mod_info list, the mod has never been updated
-        if len(self.mod_info) == 2:
-            self.steam_created_time_str = self.mod_info[1].get_text()
-            
-            self.steam_updated_time = None
-        # if there's three items in the mod_info list, the mod has been updated
-        if len(self.mod_info) == 3:
-            self.steam_created_time_str = self.mod_info[1].get_text()
-            self.steam_updated_time = self.mod_info[2].get_text()
-            
-        
-        cprint(f'\nself.created: {self.steam_created_time_str}', 'yellow')
-        cprint(f'self.updated: {self.steam_updated_time}', 'yellow')
-        self.steam_created_time_epoch = self.convert_time_to_epoch(self.steam_created_time_str)
-        print(f'self.created epoch: {self.steam_created_time_epoch}')
     
     def get_local_modified_time(self):
         """
             This method is responsible for getting the local modified time of the mod.
+            The time steamcmd recorded for the installed revision is used when it has one,
+            the mod folder's modified time otherwise.
         """
+        self._local_loaded = True
+        if self.removed_from_steam:
+            return
+
+        steamcmd_path = self.config.get('DEFAULT', 'steamcmd_path', fallback='')
+        if steamcmd_path and self.appid:
+            self.installed_item = read_all_installed_items(steamcmd_path, self.appid).get(self.wid)
+            if self.installed_item and self.installed_item.time_updated is not None:
+                self._local_modified_time_epoch = self.installed_item.time_updated
+                return
+
         mod_folder = self.config.get(self.game_name, 'mod_folder_path')
         if not os.path.exists(mod_folder):
             raise FileNotFoundError(f'{mod_folder} does not exist')
         
-        # TODO: Add support for mod names instead of just wids
-        # mod_path = os.path.join(mod_folder, self.mod_name)
-        mod_path = os.path.join(mod_folder, self.wid)
+        mod_path = self.install_path or os.path.join(mod_folder, self.wid)
 
         if not os.path.exists(mod_path):
             raise FileNotFoundError(f'{mod_path} does not exist')
         
-        self.local_modified_time_epoch = os.path.getmtime(mod_path)
-        
-        cprint(f'\nLocal modified time: {self.local_modified_time_epoch}', 'yellow')
-        cprint(f'Steam updated time: {self.steam_updated_time}', 'yellow')
+        self._local_modified_time_epoch = os.path.getmtime(mod_path)
     
     def convert_time_to_epoch(self, time_str):
         """
             This method is responsible for converting the steam time string to epoch time.
         """
         # Jun 22, 2016 @ 4:54am
-        format_ = '%b %d, %Y @ %I:%M%p'
-        epoch_time = datetime.strptime(time_str, format_).timestamp()
-        return epoch_time
+        return steam_time_to_epoch(time_str)
 
     def check_for_update(self):
         """
@@ -136,13 +261,189 @@ class ModUpdater:
         if self.removed_from_steam:
             return False
 
-        if self.steam_updated_time is None:
+        if self.steam_updated_time_epoch is None:
             return False
         
         if self.local_modified_time_epoch is None:
             return False
         
-        # if self.local_modified_time_epoch < self.steam_updated_time:
-        #     return True
+        if self.local_modified_time_epoch < self.steam_updated_time_epoch:
+            return True
         
-        return False
\ No newline at end of file
+        return False
+
+
+@dataclass
+class UpdateReport:
+    """
+        This class is responsible for storing the result of a library update check.
+    """
+    game: str
+    outdated: typing.List[WorkshopMetadata] = field(default_factory=list)
+    up_to_date: typing.List[WorkshopMetadata] = field(default_factory=list)
+    removed: typing.List[WorkshopMetadata] = field(default_factory=list)
+    errors: typing.Dict[str, str] = field(default_factory=dict)
+
+    def __str__(self):
+        return (f"{self.game}: {len(self.outdated)} outdated, {len(self.up_to_date)} up to date, "
+                f"{len(self.removed)} removed, {len(self.errors)} failed")
+
+
+class LibraryUpdateChecker:
+    """
+        This class is responsible for checking every installed mod of a game for updates at once.
+    """
+    def __init__(
+        self,
+        config_master: 'Config',
+        game: str,
+        provider: typing.Optional['MetadataProvider'] = None,
+        max_workers: int = 8,
+        manifest: typing.Optional['ManifestIndex'] = None,
+        max_age_hours: float = 0,
+        names: typing.Optional['ModNameResolver'] = None,
+    ):
+        self.config = config_master
+        self.game = game
+        self.mod_folder = self.config.get(self.game, 'mod_folder_path')
+        self.provider = provider or get_metadata_provider(self.config)
+        self.max_workers = max(1, max_workers)
+        # with a manifest, mods checked within max_age_hours are answered from it instead of steam
+        self.manifest = manifest
+        self.max_age_hours = max_age_hours
+        # with the name index, the mods rename mode installed under their names are found too
+        self.names = names
+        self.install_paths = {}
+
+    def get_local_mods(self):
+        """
+        This method is responsible for finding the installed mods in the game's mod folder.
+
+        Args:
+            None
+
+        Returns:
+            list: the wids of the installed mods
+        """
+        if not os.path.exists(self.mod_folder):
+            raise FileNotFoundError(f'{self.mod_folder} does not exist')
+
+        # the mods are installed in folders named after their wid, or in rename mode their name
+        with os.scandir(self.mod_folder) as entries:
+            self.install_paths = {entry.name: entry.path for entry in entries if entry.is_dir() and entry.name.isdigit()}
+        appid = self.config.get(self.game, 'appid', fallback=None)
+        if self.names is not None and appid:
+            for wid, path in self.names.get_installed_paths(appid, self.mod_folder).items():
+                self.install_paths.setdefault(wid, path)
+        return list(self.install_paths)
+
+    def get_updaters(self):
+        """
+        This method is responsible for making a lazy ModUpdater for every installed mod.
+
+        Args:
+            None
+
+        Returns:
+            list: the updaters, sharing this checker's provider
+        """
+        wids = self.get_local_mods()
+        return [
+            ModUpdater(self.config, wid, provider=self.provider, game=self.game, install_path=self.install_paths.get(wid))
+            for wid in wids
+        ]
+
+    def split_stale(self, updaters):
+        """
+        This method is responsible for answering the recently checked mods from the manifest.
+
+        Args:
+            updaters (list): the updaters of the installed mods
+
+        Returns:
+            list: the updaters that still need to be checked against steam
+        """
+        if self.manifest is None or not self.max_age_hours:
+            return updaters
+
+        stale = {entry.wid for entry in self.manifest.stale(self.max_age_hours, self.game)}
+        known = self.manifest.get_many(updater.wid for updater in updaters)
+
+        to_refresh = []
+        for updater in updaters:
+            entry = known.get(updater.wid)
+            if entry is None or entry.wid in stale:
+                to_refresh.append(updater)
+            else:
+                updater.apply_metadata(entry.to_metadata())
+        return to_refresh
+
+    def update_manifest(self, updaters, refreshed, errors):
+        """
+        This method is responsible for writing the checked mods to the manifest.
+
+        Args:
+            updaters (list): the updaters of the installed mods
+            refreshed (list): the updaters that were checked against steam
+            errors (dict): the errors keyed by wid
+
+        Returns:
+            None
+        """
+        now = time.time()
+        refreshed = {updater.wid for updater in refreshed}
+        known = self.manifest.get_many(updater.wid for updater in updaters)
+
+        entries = []
+        for updater in updaters:
+            if updater.wid in errors:
+                continue
+            entries.append(ManifestEntry(
+                updater.wid,
+                appid=updater.appid,
+                game=self.game,
+                name=updater.mod_name,
+                install_path=updater.install_path or os.path.join(self.mod_folder, updater.wid),
+                local_mtime=updater.local_modified_time_epoch,
+                remote_time_updated=updater.steam_updated_time_epoch,
+                size=updater.file_size,
+                removed=updater.removed_from_steam,
+                last_checked=now if updater.wid in refreshed else known[updater.wid].last_checked,
+            ))
+        self.manifest.upsert_many(entries)
+
+        # forget the mods that have been uninstalled
+        installed = {updater.wid for updater in updaters}
+        self.manifest.remove(entry.wid for entry in self.manifest.get_by_game(self.game) if entry.wid not in installed)
+
+    def check(self):
+        """
+        This method is responsible for comparing every installed mod against steam.
+
+        Args:
+            None
+
+        Returns:
+            UpdateReport: the outdated, up to date and removed mods
+        """
+        updaters = self.get_updaters()
+        to_refresh = self.split_stale(updaters)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            errors = ModUpdater.refresh_many(to_refresh, executor)
+        report = UpdateReport(self.game, errors=errors)
+
+        for updater in updaters:
+            if updater.wid in errors:
+                continue
+            if updater.removed_from_steam:
+                report.removed.append(updater.metadata)
+            elif updater.needs_update:
+                report.outdated.append(updater.metadata)
+            else:
+                report.up_to_date.append(updater.metadata)
+
+        if self.manifest is not None:
+            self.update_manifest(updaters, to_refresh, errors)
+
+        cprint(f'{report} ({len(updaters) - len(to_refresh)} answered from the manifest)', 'yellow')
+        return report
\ No newline at end of file
@@ -0,0 +1,33 @@
+"""
+Times the targeted scan of ScraperMetadataProvider against the full soup parse
+on the saved workshop pages in test/fixtures
+
+    python test/bench_metadata.py [repeat]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.Utils.metadata import ScraperMetadataProvider
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def main(repeat: int = 20):
+    print(f'{"page":<36} {"size":>8} {"soup":>10} {"fast":>10} {"speedup":>8}  same')
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+            html = f.read()
+
+        soup = min(timeit.repeat(lambda: ScraperMetadataProvider.parse_page_soup('1', html), number=1, repeat=repeat))
+        fast = min(timeit.repeat(lambda: ScraperMetadataProvider.parse_page('1', html), number=1, repeat=repeat))
+        same = ScraperMetadataProvider.parse_page('1', html) == ScraperMetadataProvider.parse_page_soup('1', html)
+        print(f'{name:<36} {len(html) // 1024:>6}KB {soup * 1000:>8.2f}ms {fast * 1000:>8.2f}ms {soup / fast:>7.0f}x  {same}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,194 @@
+import os
+
+import pytest
+
+from src.Utils import installer as installer_module
+from src.Utils.installer import COPY, HARDLINK, RENAME, SYNC, ModInstaller
+
+
+def write(path: str, data: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(data)
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def tree(root: str) -> dict:
+    files = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(dirpath, name)
+            files[os.path.relpath(path, root).replace(os.sep, '/')] = read(path)
+    return files
+
+
+@pytest.fixture
+def no_reflink(monkeypatch):
+    """
+    Install as on a filesystem without reflinks, so copy mode hardlinks
+    """
+    link = ModInstaller._link
+    monkeypatch.setattr(
+        ModInstaller, '_link', staticmethod(lambda method, src, dst: method == HARDLINK and link(method, src, dst))
+    )
+
+
+@pytest.fixture
+def paths(tmp_path):
+    source = str(tmp_path / 'content' / '1')
+    dest = str(tmp_path / 'mods' / '1')
+    write(os.path.join(source, 'About', 'About.xml'), 'about')
+    write(os.path.join(source, 'Textures', 'a.png'), 'a')
+    os.makedirs(os.path.dirname(dest))
+    return source, dest
+
+
+def test_move_install_renames(paths):
+    source, dest = paths
+    result = ModInstaller().install(source, dest)
+
+    assert result.method == RENAME
+    assert tree(dest) == {'About/About.xml': 'about', 'Textures/a.png': 'a'}
+    assert not os.path.exists(source)
+
+
+def test_swap_replaces_the_old_version(paths):
+    source, dest = paths
+    write(os.path.join(dest, 'old.txt'), 'old')
+
+    ModInstaller(delta_sync=False).install(source, dest)
+
+    assert tree(dest) == {'About/About.xml': 'about', 'Textures/a.png': 'a'}
+    staging, backup = ModInstaller.get_temp_paths(dest)
+    assert not os.path.exists(staging)
+    assert not os.path.exists(backup)
+
+
+def test_failed_swap_keeps_the_old_version(paths, monkeypatch):
+    source, dest = paths
+    write(os.path.join(dest, 'old.txt'), 'old')
+    staging, _ = ModInstaller.get_temp_paths(dest)
+    replace = os.replace
+
+    def fail_swap_in(src, dst):
+        if src == staging:
+            raise OSError('swap failed')
+        replace(src, dst)
+
+    monkeypatch.setattr(installer_module.os, 'replace', fail_swap_in)
+    with pytest.raises(OSError):
+        ModInstaller(copy_mode=True, delta_sync=False).install(source, dest)
+    monkeypatch.undo()
+
+    assert tree(dest) == {'old.txt': 'old'}
+    assert not os.path.exists(staging)
+
+
+def test_recover_puts_back_an_interrupted_swap(paths):
+    _, dest = paths
+    staging, backup = ModInstaller.get_temp_paths(dest)
+    # the old version was moved aside and the staged one never swapped in
+    write(os.path.join(backup, 'old.txt'), 'old')
+    write(os.path.join(staging, 'new.txt'), 'new')
+
+    ModInstaller().recover(dest)
+
+    assert tree(dest) == {'old.txt': 'old'}
+    assert not os.path.exists(staging)
+    assert not os.path.exists(backup)
+
+
+def test_recover_drops_the_backup_of_a_finished_swap(paths):
+    _, dest = paths
+    _, backup = ModInstaller.get_temp_paths(dest)
+    write(os.path.join(dest, 'new.txt'), 'new')
+    write(os.path.join(backup, 'old.txt'), 'old')
+
+    ModInstaller().recover(dest)
+
+    assert tree(dest) == {'new.txt': 'new'}
+    assert not os.path.exists(backup)
+
+
+def test_delta_sync_adds_changes_and_deletes(paths):
+    source, dest = paths
+    installer = ModInstaller(copy_mode=True)
+    installer.install(source, dest)
+
+    write(os.path.join(source, 'Textures', 'a.png'), 'changed')
+    write(os.path.join(source, 'Textures', 'b.png'), 'b')
+    os.remove(os.path.join(source, 'About', 'About.xml'))
+    os.rmdir(os.path.join(source, 'About'))
+
+    result = installer.install(source, dest)
+
+    assert result.method == SYNC
+    assert tree(dest) == {'Textures/a.png': 'changed', 'Textures/b.png': 'b'}
+    assert result.sync.deleted == 1
+    assert result.sync.unchanged + result.sync.linked + result.sync.copied == 2
+    assert not os.path.exists(ModInstaller.get_temp_paths(dest)[0])
+
+
+def test_delta_sync_keeps_unchanged_files(paths):
+    source, dest = paths
+    installer = ModInstaller(copy_mode=True)
+    installer.install(source, dest)
+    inode = os.stat(os.path.join(dest, 'Textures', 'a.png')).st_ino
+
+    result = installer.sync(source, dest)
+
+    assert result.unchanged == 2
+    assert result.copied == 0
+    assert os.stat(os.path.join(dest, 'Textures', 'a.png')).st_ino == inode
+
+
+def test_delta_sync_never_writes_through_a_hardlink(paths, no_reflink):
+    source, dest = paths
+    installer = ModInstaller(copy_mode=True)
+    assert installer.install(source, dest).method == HARDLINK
+
+    # steamcmd replaces a file of its download, the installed copy still shares the old inode
+    old = os.path.join(dest, 'Textures', 'a.png')
+    kept = os.path.join(os.path.dirname(os.path.dirname(source)), 'kept.png')
+    os.link(old, kept)
+    os.remove(os.path.join(source, 'Textures', 'a.png'))
+    write(os.path.join(source, 'Textures', 'a.png'), 'changed')
+
+    installer.install(source, dest)
+
+    assert read(os.path.join(dest, 'Textures', 'a.png')) == 'changed'
+    assert read(kept) == 'a'
+
+
+def test_copy_mode_falls_back_to_copying(paths, monkeypatch):
+    source, dest = paths
+    monkeypatch.setattr(ModInstaller, '_link', staticmethod(lambda method, src, dst: False))
+
+    result = ModInstaller(copy_mode=True).install(source, dest)
+
+    assert result.method == COPY
+    assert tree(dest) == tree(source)
+    assert not os.path.samefile(os.path.join(dest, 'Textures', 'a.png'), os.path.join(source, 'Textures', 'a.png'))
+
+
+def test_copy_mode_falls_back_to_hardlinks(paths, no_reflink):
+    source, dest = paths
+    result = ModInstaller(copy_mode=True).install(source, dest)
+
+    assert result.method == HARDLINK
+    assert os.path.samefile(os.path.join(dest, 'Textures', 'a.png'), os.path.join(source, 'Textures', 'a.png'))
+
+
+def test_chunked_copy(paths):
+    source, dest = paths
+    data = ''.join(chr(ord('a') + i % 26) for i in range(10000))
+    write(os.path.join(source, 'big.bin'), data)
+
+    installer = ModInstaller(copy_mode=True, chunk_size=1024)
+    installer._copy_files([(os.path.join(source, 'big.bin'), os.path.join(os.path.dirname(dest), 'big.bin'))])
+
+    assert read(os.path.join(os.path.dirname(dest), 'big.bin')) == data
@@ -0,0 +1,139 @@
+from threading import Event
+import os
+
+import pytest
+
+from src.Utils.journal import DONE, IN_PROGRESS, QUEUED, DownloadJournal
+from src.Utils.metadata import WorkshopMetadata
+from src.Utils.workers import SteamCMDWorkerPool
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = DownloadJournal(str(tmp_path / 'journal.sqlite'))
+    yield journal
+    journal.close()
+
+
+def test_outstanding_items(journal):
+    journal.queue([('1', '9'), ('2', '9'), ('3', '9'), ('4', '9')])
+    journal.mark(['2'], IN_PROGRESS)
+    journal.mark(['3'], DONE)
+    journal.mark_failed({'4': 'Timeout'})
+
+    assert sorted((entry.wid, entry.state) for entry in journal.outstanding()) == [('1', QUEUED), ('2', IN_PROGRESS)]
+    assert [(entry.wid, entry.reason) for entry in journal.failed()] == [('4', 'Timeout')]
+
+
+def test_prune_forgets_done_items(journal):
+    journal.queue([('1', '9'), ('2', '9')])
+    journal.mark(['1'], DONE)
+    journal.prune()
+
+    assert [entry.wid for entry in journal._select()] == ['2']
+
+
+def test_journal_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    journal = DownloadJournal(path)
+    journal.queue([('1', '9')])
+    journal.close()
+
+    journal = DownloadJournal(path)
+    assert [(entry.wid, entry.appid, entry.state) for entry in journal.outstanding()] == [('1', '9', QUEUED)]
+    journal.close()
+
+
+class FakeProvider:
+    def __init__(self, time_updated: float):
+        self.time_updated = time_updated
+
+    def get_details(self, wids):
+        return {wid: WorkshopMetadata(wid, time_updated=self.time_updated) for wid in wids}
+
+
+class FakeSteamCMD:
+    """
+    The parts of SteamCMD the worker pool uses to recover downloads
+    """
+    def __init__(self, steamcmd_path: str, time_updated: float):
+        self.steamcmd_path = steamcmd_path
+        self.metadata_provider = FakeProvider(time_updated)
+        self.cancelled = Event()
+        self.rename_mode = False
+        self.reports = []
+
+    def report(self, text, color=None):
+        self.reports.append(text)
+
+
+def download_into_sandbox(steamcmd_path: str, sandbox: int, appid: str, items: dict):
+    """
+    Lay out a sandbox the way steamcmd leaves a finished download
+    """
+    workshop = os.path.join(SteamCMDWorkerPool.get_sandbox_path(steamcmd_path, sandbox), 'steamapps', 'workshop')
+    for wid in items:
+        os.makedirs(os.path.join(workshop, 'content', appid, wid))
+    entries = ''.join(f'"{wid}" {{ "size" "1" "timeupdated" "{time_updated}" }}' for wid, time_updated in items.items())
+    with open(os.path.join(workshop, f'appworkshop_{appid}.acf'), 'w') as f:
+        f.write(f'"AppWorkshop" {{ "WorkshopItemsInstalled" {{ {entries} }} }}')
+
+
+def make_pool(tmp_path, journal, time_updated: float, fail=()):
+    steamcmd = FakeSteamCMD(str(tmp_path / 'steamcmd'), time_updated)
+    pool = SteamCMDWorkerPool(steamcmd, 1, journal=journal)
+    pool.installed = {}
+
+    def install(content_path, wid, appid, name=None, revision=None):
+        if wid in fail:
+            raise PermissionError('locked')
+        pool.installed[wid] = revision
+
+    pool.install = install
+    return pool
+
+
+def test_recover_installs_finished_downloads(tmp_path, journal):
+    journal.queue([('1', '9'), ('2', '9'), ('3', '9')])
+    pool = make_pool(tmp_path, journal, time_updated=100)
+    download_into_sandbox(pool.steamcmd.steamcmd_path, 0, '9', {'1': 100})
+    download_into_sandbox(pool.steamcmd.steamcmd_path, 2, '9', {'2': 150})
+
+    recovered = pool.recover([('1', '9'), ('2', '9'), ('3', '9')])
+
+    assert sorted(recovered) == ['1', '2']
+    assert pool.installed == {'1': 100, '2': 150}
+    assert [entry.wid for entry in journal.outstanding()] == ['3']
+
+
+def test_recover_skips_stale_revisions(tmp_path, journal):
+    journal.queue([('1', '9'), ('2', '9')])
+    pool = make_pool(tmp_path, journal, time_updated=200)
+    download_into_sandbox(pool.steamcmd.steamcmd_path, 0, '9', {'1': 100, '2': 200})
+
+    assert pool.recover([('1', '9'), ('2', '9')]) == ['2']
+    assert [entry.wid for entry in journal.outstanding()] == ['1']
+
+
+def test_recover_uses_the_newest_sandbox(tmp_path, journal):
+    pool = make_pool(tmp_path, journal, time_updated=200)
+    download_into_sandbox(pool.steamcmd.steamcmd_path, 0, '9', {'1': 100})
+    download_into_sandbox(pool.steamcmd.steamcmd_path, 1, '9', {'1': 200})
+
+    assert pool.recover([('1', '9')]) == ['1']
+    assert pool.installed == {'1': 200}
+
+
+def test_recover_leaves_items_that_fail_to_install(tmp_path, journal):
+    journal.queue([('1', '9'), ('2', '9')])
+    pool = make_pool(tmp_path, journal, time_updated=100, fail={'1'})
+    download_into_sandbox(pool.steamcmd.steamcmd_path, 0, '9', {'1': 100, '2': 100})
+
+    assert pool.recover([('1', '9'), ('2', '9')]) == ['2']
+    assert [entry.wid for entry in journal.outstanding()] == ['1']
+    assert any('1 could not be installed' in text for text in pool.steamcmd.reports)
+
+
+def test_recover_without_sandboxes(tmp_path, journal):
+    pool = make_pool(tmp_path, journal, time_updated=100)
+    assert pool.recover([('1', '9')]) == []
@@ -0,0 +1,154 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs
+import json
+import os
+
+import pytest
+import requests
+
+from src.Utils.metadata import ScraperMetadataProvider, SteamAPIMetadataProvider
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('name', [
+    'workshop_item.html',
+    'workshop_item_not_updated.html',
+    'workshop_item_markup_changed.html',
+    'workshop_item_removed.html',
+])
+def test_parse_page_matches_soup(name):
+    html = read_fixture(name)
+    assert ScraperMetadataProvider.parse_page('1', html) == ScraperMetadataProvider.parse_page_soup('1', html)
+
+
+def test_parse_page_fast():
+    metadata = ScraperMetadataProvider.parse_page_fast('1', read_fixture('workshop_item.html'))
+    assert metadata is not None
+    assert metadata.title == 'Combat Extended & Friends'
+    assert metadata.appid == '294100'
+    assert metadata.game_name == 'RimWorld'
+    assert metadata.file_size is not None
+    assert metadata.time_created is not None
+    assert metadata.time_updated is not None
+    assert not metadata.removed
+
+
+def test_parse_page_fast_not_updated():
+    metadata = ScraperMetadataProvider.parse_page_fast('1', read_fixture('workshop_item_not_updated.html'))
+    assert metadata is not None
+    assert metadata.time_created is not None
+    assert metadata.time_updated is None
+
+
+def test_parse_page_fast_leaves_unknown_stats_to_soup():
+    html = read_fixture('workshop_item_markup_changed.html')
+    assert ScraperMetadataProvider.parse_page_fast('1', html) is None
+
+    metadata = ScraperMetadataProvider.parse_page('1', html)
+    assert not metadata.removed
+    assert metadata.file_size is not None
+    assert metadata.time_created is not None
+
+
+def test_parse_page_removed():
+    metadata = ScraperMetadataProvider.parse_page('1', read_fixture('workshop_item_removed.html'))
+    assert metadata.removed
+
+
+class SteamAPIStub(BaseHTTPRequestHandler):
+    """
+    Answers GetPublishedFileDetails like the steam web api, for the items in `items`.
+    The ids in `failing` make the whole request fail with a 500
+    """
+    items = {}
+    failing = set()
+    requests = []
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        ids = [form[f'publishedfileids[{i}]'][0] for i in range(int(form['itemcount'][0]))]
+        type(self).requests.append((self.path, ids))
+
+        if self.failing.intersection(ids):
+            self.send_response(500)
+            self.end_headers()
+            return
+
+        details = [self.items.get(id_, {'publishedfileid': id_, 'result': 9}) for id_ in ids]
+        body = json.dumps({'response': {'result': 1, 'resultcount': len(details), 'publishedfiledetails': details}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def steam_api():
+    SteamAPIStub.items = {
+        str(wid): {
+            'publishedfileid': str(wid),
+            'result': 1,
+            'consumer_app_id': 294100,
+            'title': f'Mod {wid}',
+            'time_created': 1551675240,
+            'time_updated': 1687474920,
+            'file_size': '12940000',
+        }
+        for wid in range(1, 6)
+    }
+    SteamAPIStub.failing = set()
+    SteamAPIStub.requests = []
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SteamAPIStub)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_steam_api_batches(steam_api):
+    provider = SteamAPIMetadataProvider(api_url=steam_api, batch_size=2)
+    details = provider.get_details(['1', '2', '3', '4', '5'])
+
+    assert [ids for _, ids in SteamAPIStub.requests] == [['1', '2'], ['3', '4'], ['5']]
+    assert all(path == '/ISteamRemoteStorage/GetPublishedFileDetails/v1/' for path, _ in SteamAPIStub.requests)
+    assert sorted(details) == ['1', '2', '3', '4', '5']
+    metadata = details['3']
+    assert metadata.appid == '294100'
+    assert metadata.title == 'Mod 3'
+    assert metadata.time_created == 1551675240
+    assert metadata.time_updated == 1687474920
+    assert metadata.file_size == 12940000
+    assert not metadata.removed
+
+
+def test_steam_api_removed_items(steam_api):
+    provider = SteamAPIMetadataProvider(api_url=steam_api)
+    details = provider.get_details(['1', '404'])
+
+    assert len(SteamAPIStub.requests) == 1
+    assert not details['1'].removed
+    assert details['404'].removed
+    assert details['404'].title is None
+
+
+def test_steam_api_http_error(steam_api):
+    SteamAPIStub.failing = {'3'}
+    provider = SteamAPIMetadataProvider(api_url=steam_api, batch_size=2)
+
+    with pytest.raises(requests.HTTPError):
+        provider.get_details(['1', '2', '3', '4'])
+    # the batches after the failing one aren't requested
+    assert [ids for _, ids in SteamAPIStub.requests] == [['1', '2'], ['3', '4']]
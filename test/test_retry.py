@@ -0,0 +1,50 @@
+from threading import Event, Timer
+import time
+
+from src.Utils.retry import RetryScheduler
+
+
+def test_backoff_doubles_up_to_the_max():
+    scheduler = RetryScheduler(base_delay=5, max_delay=30, jitter=0)
+    assert [scheduler.backoff(attempt) for attempt in range(1, 6)] == [5, 10, 20, 30, 30]
+
+
+def test_backoff_jitter_stays_in_range():
+    scheduler = RetryScheduler(base_delay=10, jitter=0.5)
+    for _ in range(100):
+        assert 5 <= scheduler.backoff(1) <= 15
+
+
+def test_failures_are_retried_until_out_of_attempts():
+    scheduler = RetryScheduler(max_attempts=2, base_delay=10, jitter=0, batch_size=2)
+    scheduler.add_failures({'1': 'Timeout', '2': 'Timeout', '3': 'Timeout'}, {'1': '9', '2': '9', '3': '9'})
+
+    assert scheduler.pending
+    assert scheduler.due_batches(now=time.time()) == []
+    assert scheduler.due_batches(now=time.time() + 11) == [[('1', '9'), ('2', '9')], [('3', '9')]]
+    assert not scheduler.pending
+
+    scheduler.add_failures({'1': 'Timeout'}, {'1': '9'})
+    assert not scheduler.pending
+    failed = scheduler.final_report()
+    assert list(failed) == ['1']
+    assert failed['1'].attempts == 2
+    assert failed['1'].reason == 'Timeout'
+
+
+def test_wait_ends_on_cancel():
+    scheduler = RetryScheduler(base_delay=60, jitter=0)
+    scheduler.add_failures({'1': 'Timeout'}, {'1': '9'})
+    cancelled = Event()
+    Timer(0.1, cancelled.set).start()
+
+    started = time.monotonic()
+    assert scheduler.wait(cancelled)
+    assert time.monotonic() - started < 5
+
+
+def test_wait_returns_when_due():
+    scheduler = RetryScheduler(base_delay=0.1, jitter=0)
+    scheduler.add_failures({'1': 'Timeout'}, {'1': '9'})
+    assert not scheduler.wait(Event())
+    assert scheduler.due_batches() == [[('1', '9')]]
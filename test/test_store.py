@@ -0,0 +1,30 @@
+import sqlite3
+
+import pytest
+
+from src.Utils.manifest import ManifestEntry, ManifestIndex
+from src.Utils.store import MAX_PARAMS
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = ManifestIndex(str(tmp_path / 'manifest.sqlite'))
+    yield manifest
+    manifest.close()
+
+
+def test_lookups_span_several_chunks(manifest):
+    wids = [str(i) for i in range(MAX_PARAMS * 2 + 1)]
+    manifest.upsert_many(ManifestEntry(wid, appid='9') for wid in wids)
+    manifest.set_installed({wid: float(wid) for wid in wids})
+
+    assert sorted(manifest.get_many(wids + ['missing'])) == sorted(wids)
+    assert manifest.get_installed(wids) == {wid: float(wid) for wid in wids}
+
+
+def test_close_closes_the_connection(tmp_path):
+    manifest = ManifestIndex(str(tmp_path / 'manifest.sqlite'))
+    manifest.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        manifest.get('1')